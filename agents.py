@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from options import BUDGETS, CATEGORIES, DISTRICTS, PAYMENTS, RENOVATIONS, ROOMS
+from outbox import BULK
+
+logger = logging.getLogger(__name__)
+
+# Предел длины одного сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Контакт пользователь вводит сам, поэтому в дайджесте он обрезается
+MAX_CONTACT_LENGTH = 200
+
+
+def parse_agent_chats(spec):
+    """Разбирает настройку вида ``район:chat_id,район:chat_id`` в словарь."""
+    routes = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        district, _, chat_id = item.partition(':')
+        if district not in DISTRICTS:
+            raise ValueError(f"Неизвестный район в настройке чатов агентов: {district}")
+        routes[district] = int(chat_id)
+    return routes
+
+
+def format_lead(lead):
+    """Одна строка дайджеста с заявкой."""
+    details = ', '.join(filter(None, (
+        CATEGORIES.label(lead.category),
+        ROOMS.label(lead.rooms),
+        DISTRICTS.label(lead.district),
+        RENOVATIONS.label(lead.renovation) and f"ремонт: {RENOVATIONS.label(lead.renovation).lower()}",
+        BUDGETS.label(lead.budget),
+        PAYMENTS.label(lead.payment),
+    )))
+    return f"• {details}\n  Контакт: {lead.contact[:MAX_CONTACT_LENGTH]} (id {lead.user_id})\n"
+
+
+class LeadNotifier:
+    """Рассылка новых заявок агентам с объединением всплесков в дайджесты.
+
+    Заявка направляется в чат агентов своего района (``routes``), а если для
+    района чат не задан — в общий чат сотрудников ``staff_chat_id``. Первая
+    заявка в чат открывает окно в ``window`` секунд; всё, что пришло за это
+    окно, уходит одним сообщением (или несколькими, если не помещается в
+    лимит длины Telegram). Сообщения отправляются через общую очередь в
+    полосе BULK, поэтому не мешают ответам пользователям.
+    """
+
+    def __init__(self, outbox, routes=None, staff_chat_id=None, window=10):
+        self.outbox = outbox
+        self.routes = dict(routes or {})
+        self.staff_chat_id = staff_chat_id
+        self.window = window
+        self._pending = defaultdict(list)
+        self._timers = {}
+        self._sending = set()
+        self.leads = 0
+        self.messages = 0
+
+    @property
+    def enabled(self):
+        return bool(self.routes) or self.staff_chat_id is not None
+
+    def chat_for(self, lead):
+        """Чат, куда отправляется заявка, или None."""
+        return self.routes.get(lead.district, self.staff_chat_id)
+
+    def notify(self, lead):
+        """Добавляет заявку в дайджест её чата."""
+        chat_id = self.chat_for(lead)
+        if chat_id is None:
+            return
+        self.leads += 1
+        self._pending[chat_id].append(lead)
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+
+    def stats(self):
+        return {
+            'pending': sum(len(leads) for leads in self._pending.values()),
+            'leads': self.leads,
+            'messages': self.messages,
+        }
+
+    async def _flush_later(self, chat_id):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        self._flush(chat_id)
+
+    def _flush(self, chat_id):
+        leads = self._pending.pop(chat_id, [])
+        if not leads:
+            return
+        for text in self._digest_messages(leads):
+            future = self.outbox.send_message(chat_id, text, priority=BULK)
+            self._sending.add(future)
+            future.add_done_callback(self._sending.discard)
+            self.messages += 1
+        logger.info("Отправлен дайджест заявок в чат %s: %d", chat_id, len(leads))
+
+    @staticmethod
+    def _digest_messages(leads):
+        """Разбивает дайджест на сообщения не длиннее лимита Telegram."""
+        header = f"📥 Новые заявки: {len(leads)}\n\n"
+        messages = []
+        chunk = [header]
+        length = len(header)
+        for line in map(format_lead, leads):
+            if length + len(line) > MAX_MESSAGE_LENGTH and len(chunk) > 1:
+                messages.append(''.join(chunk))
+                chunk, length = [], 0
+            chunk.append(line)
+            length += len(line)
+        messages.append(''.join(chunk))
+        return messages
+
+    async def close(self, timeout=10):
+        """Отправляет накопленные дайджесты, не дожидаясь конца окна.
+
+        Ждёт (не дольше ``timeout`` секунд), пока очередь доставит дайджесты,
+        поэтому вызывается до остановки клиента Bot API.
+        """
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for chat_id in list(self._pending):
+            self._flush(chat_id)
+        if self._sending:
+            _, undelivered = await asyncio.wait(set(self._sending), timeout=timeout)
+            if undelivered:
+                logger.error("Не доставлены дайджесты заявок при остановке: %d", len(undelivered))
@@ -0,0 +1,178 @@
+"""Нагрузочный тест мастера бота без настоящего Telegram.
+
+Бот из bot.py запускается в режиме long polling против локальной заглушки
+Bot API (benchmarks/fake_servers.py), OLX подменяется записанными страницами.
+N имитируемых пользователей одновременно проходят весь разговор: /start,
+выбор категории, комнат, района, ремонта, бюджета, оплаты и отправку контакта.
+Задержка шага — время от появления обновления в getUpdates до ответа бота
+в чат. Печатаются пропускная способность, p50/p99 по шагам и доля ошибок.
+
+По умолчанию лимиты очереди исходящих сообщений подняты, чтобы измерять
+сам бот; с --real-limits шаг контакта упирается в 30 сообщений/с Telegram.
+
+Запуск: python3 benchmarks/bench_conversation.py [--users N] [--flows N]
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeBotApi, FakeOlx, serve  # noqa: E402
+from options import BUDGETS, CATEGORIES, DISTRICTS, PAYMENTS, RENOVATIONS, ROOMS  # noqa: E402
+
+TOKEN = '123456:BENCH'
+ERROR_PREFIX = 'Произошла ошибка'
+
+# Шаги мастера по порядку: (название, варианты ответа для инлайн-кнопок)
+CALLBACK_STEPS = (
+    ('category', CATEGORIES),
+    ('rooms', ROOMS),
+    ('district', DISTRICTS),
+    ('renovation', RENOVATIONS),
+    ('budget', BUDGETS),
+    ('payment', PAYMENTS),
+)
+STEPS = ('start',) + tuple(name for name, _ in CALLBACK_STEPS) + ('contact',)
+
+
+class StepFailed(Exception):
+    pass
+
+
+class LoadGenerator:
+    """Имитирует пользователей и собирает задержки шагов."""
+
+    def __init__(self, api, timeout, seed=2024):
+        self.api = api
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows = 0
+
+    async def _step(self, name, user_id, push, replies=1):
+        started = time.perf_counter()
+        push()
+        message = None
+        try:
+            for index in range(replies):
+                _, reply = await self.api.next_reply(user_id, self.timeout)
+                if reply['text'].startswith(ERROR_PREFIX):
+                    raise StepFailed(name)
+                if index == 0:
+                    self.latencies[name].append(time.perf_counter() - started)
+                    message = reply
+        except (asyncio.TimeoutError, StepFailed):
+            self.errors[name] += 1
+            raise StepFailed(name)
+        return message
+
+    async def run_user(self, user_id, flows, delay):
+        await asyncio.sleep(delay)
+        for _ in range(flows):
+            try:
+                message = await self._step('start', user_id, lambda: self.api.push_command(user_id, 'start'))
+                for name, group in CALLBACK_STEPS:
+                    data = self.rng.choice(group.keys)
+                    message = await self._step(
+                        name, user_id, lambda: self.api.push_callback(user_id, data, message)
+                    )
+                # После итогового ответа приходит предложение подписаться
+                await self._step(
+                    'contact', user_id, lambda: self.api.push_contact(user_id, f'+38067{user_id:07d}'), replies=2
+                )
+            except StepFailed:
+                continue
+            self.flows += 1
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def report(generator, api, users, flows, elapsed):
+    attempted = users * flows
+    errors = sum(generator.errors.values())
+    updates = sum(len(values) for values in generator.latencies.values())
+    print(f"Пользователей: {users}, прохождений: {generator.flows}/{attempted}, "
+          f"ошибок: {errors} ({errors / attempted:.1%} прохождений)")
+    print(f"Время: {elapsed:.2f} с, {generator.flows / elapsed:.1f} прохождений/с, "
+          f"{updates / elapsed:.1f} шагов/с")
+    print(f"{'шаг':>12} {'n':>6} {'p50, мс':>9} {'p99, мс':>9} {'max, мс':>9} {'ошибок':>7}")
+    for name in STEPS:
+        values = sorted(generator.latencies[name])
+        if values:
+            p50, p99, top = (percentile(values, 0.5), percentile(values, 0.99), values[-1])
+            print(f"{name:>12} {len(values):6d} {p50 * 1000:9.1f} {p99 * 1000:9.1f} {top * 1000:9.1f} "
+                  f"{generator.errors[name]:7d}")
+        else:
+            print(f"{name:>12} {0:6d} {'-':>9} {'-':>9} {'-':>9} {generator.errors[name]:7d}")
+    calls = ', '.join(f"{method}={count}" for method, count in sorted(api.calls.items()))
+    print(f"Вызовы Bot API: {calls}")
+
+
+async def run(args):
+    api = FakeBotApi(TOKEN, latency=args.api_latency / 1000)
+    olx = FakeOlx()
+    runner, url = await serve(api, olx)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Окружение задаётся до импорта bot.py: оно читается при создании синглтонов
+        os.environ.update(
+            DB_PATH=os.path.join(tmp, 'bench.db'),
+            OLX_BASE_URL=url,
+            PREWARM_INTERVAL='0',
+            METRICS_PORT='',
+        )
+        if not args.real_limits:
+            os.environ.update(OUTBOX_GLOBAL_RATE='100000', OUTBOX_CHAT_RATE='100000')
+        bot = importlib.import_module('bot')
+        logging.getLogger().setLevel(logging.WARNING)
+
+        application = bot.build_application(TOKEN, base_url=url + '/bot')
+        await application.initialize()
+        await application.post_init(application)
+        await application.updater.start_polling(poll_interval=0, timeout=1)
+        await application.start()
+
+        generator = LoadGenerator(api, timeout=args.timeout)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            generator.run_user(100000 + index, args.flows, args.ramp * index / args.users)
+            for index in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+    await runner.cleanup()
+
+    report(generator, api, args.users, args.flows, elapsed)
+    print(f"Запросов к OLX: {olx.requests}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100, help='одновременных пользователей')
+    parser.add_argument('--flows', type=int, default=1, help='прохождений мастера на пользователя')
+    parser.add_argument('--ramp', type=float, default=1.0, help='за сколько секунд подключаются все пользователи')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа Bot API, мс')
+    parser.add_argument('--timeout', type=float, default=30.0, help='сколько ждать ответа на шаг, с')
+    parser.add_argument('--real-limits', action='store_true', help='оставить лимиты отправки Telegram')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
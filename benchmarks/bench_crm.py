@@ -0,0 +1,88 @@
+"""Пропускная способность выгрузки заявок в CRM.
+
+Заявки записываются в базу через LeadPipeline, затем CrmSync выгружает их
+в локальную заглушку CRM (benchmarks/fake_servers.py) с заданной задержкой
+ответа и долей отказов 503. Сравниваются пачки по --batch-size и выгрузка по
+одной заявке (на --single-leads заявках); в конце выгрузка повторяется с потерянной контрольной точкой,
+чтобы показать, что повтор не создаёт новых заявок в CRM.
+
+Запуск: python3 benchmarks/bench_crm.py [--leads N] [--latency МС] [--failure-rate P]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from crm import CrmSync, HttpSink  # noqa: E402
+from fake_servers import FakeCrm, serve  # noqa: E402
+from leads import Lead, LeadPipeline  # noqa: E402
+
+
+async def fill(path, count):
+    pipeline = LeadPipeline(path)
+    await pipeline.open()
+    for index in range(count):
+        await pipeline.submit(Lead(
+            user_id=index, chat_id=index, category='rent_apartment', rooms='2_rooms',
+            district='central_district', renovation='cosmetic_renovation', budget='budget_2',
+            payment='cash', contact=f'+38067{index:07d}'
+        ))
+    await pipeline.close()
+
+
+async def sync(args, path, batch_size):
+    crm = FakeCrm(latency=args.latency / 1000, failure_rate=args.failure_rate)
+    runner, base_url = await serve(crm)
+    sink = HttpSink(base_url + '/crm/leads', max_backoff=0.05)
+    sink.name = f'bench-{batch_size}'
+    crm_sync = CrmSync(path, sink, batch_size=batch_size)
+    await crm_sync.open()
+    started = time.perf_counter()
+    while await crm_sync.run():
+        pass
+    elapsed = time.perf_counter() - started
+
+    # Теряем контрольную точку, как при сбое до её сохранения, и выгружаем заново
+    crm_sync.checkpoint = 0
+    while await crm_sync.run():
+        pass
+    await crm_sync.close()
+    await runner.cleanup()
+    return crm, elapsed
+
+
+async def run(args):
+    print(f"Задержка CRM: {args.latency:.0f} мс, отказов: {args.failure_rate:.0%}")
+    # Выгрузка по одной заявке медленная, поэтому для неё берётся меньше заявок
+    for batch_size, count in ((args.batch_size, args.leads), (1, args.single_leads)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'leads.db')
+            await fill(path, count)
+            crm, elapsed = await sync(args, path, batch_size)
+        print(
+            f"пачка {batch_size:>5}: {count / elapsed:9.0f} заявок/с, заявок {count}, запросов {crm.batches}, "
+            f"отказов 503 {crm.failures}, получено uid {len(crm.uids)}/{count}, "
+            f"повторов после потери точки {crm.duplicates}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leads', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--single-leads', type=int, default=100, help='заявок для выгрузки по одной')
+    parser.add_argument('--latency', type=float, default=20.0, help='задержка ответа CRM, мс')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='доля ответов 503')
+    # Повторы после 503 ожидаемы и не должны засорять вывод
+    logging.getLogger('crm').setLevel(logging.ERROR)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
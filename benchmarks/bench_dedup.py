@@ -0,0 +1,121 @@
+"""Поиск копий объявлений через MinHash/LSH на синтетическом корпусе.
+
+Генерируются объявления, часть которых — перепосты и копии других агентств:
+тот же текст с мелкими правками, переставленными фразами и ценой в пределах
+пары процентов. Для каждого размера корпуса печатается время подписей и
+группировки, полнота и точность по парам копий, а для небольших корпусов —
+время полного попарного сравнения подписей для сравнения.
+
+Запуск: python3 benchmarks/bench_dedup.py [--sizes 10000,50000,200000] [--duplicate-share 0.3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import DEFAULT_THRESHOLD, NUM_PERM, minhash_signature, near_duplicate_clusters  # noqa: E402
+
+WORDS = (
+    'квартира кімната ремонт меблі техніка балкон кухня санвузол метро парк школа садочок поверх ліфт '
+    'новобудова цегляний панельний опалення автономне центральне власник агентство документи торг '
+    'простора світла тиха затишна сучасна двір паркінг охорона відеоспостереження вид річка набережна'
+).split()
+STREETS = ['пр. Яворницького', 'вул. Січеславська Набережна', 'вул. Гоголя', 'пр. Гагаріна', 'вул. Робоча']
+
+
+def make_original(rng):
+    title = f"{rng.randint(1, 4)}-кімнатна квартира, {rng.choice(STREETS)}, {rng.randint(1, 200)}"
+    description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+    return title, description, rng.randrange(8, 160) * 500
+
+
+def make_copy(rng, original):
+    """Перепост: мелкие правки текста, перестановка фраз и немного другая цена."""
+    title, description, price = original
+    words = description.split()
+    for _ in range(max(1, len(words) // 20)):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    cut = rng.randrange(len(words))
+    words = words[cut:] + words[:cut]
+    if rng.random() < 0.5:
+        title = title.replace('квартира', 'квартиру')
+    price = int(price * rng.uniform(0.98, 1.02))
+    return title, ' '.join(words), price
+
+
+def make_corpus(size, duplicate_share, rng):
+    listings, groups = [], []
+    while len(listings) < size:
+        original = make_original(rng)
+        group = len(listings)
+        listings.append(original)
+        groups.append(group)
+        if rng.random() < duplicate_share:
+            for _ in range(rng.randint(1, 4)):
+                if len(listings) < size:
+                    listings.append(make_copy(rng, original))
+                    groups.append(group)
+    return listings, groups
+
+
+def duplicate_pairs(labels):
+    members = defaultdict(list)
+    for index, label in enumerate(labels):
+        members[label].append(index)
+    return {(a, b) for group in members.values() for i, a in enumerate(group) for b in group[i + 1:]}
+
+
+def brute_force_seconds(signatures):
+    """Время попарного сравнения всех подписей (то, чего LSH позволяет избежать)."""
+    matrix = np.frombuffer(b''.join(signatures), dtype=np.uint32).reshape(-1, NUM_PERM)
+    started = time.perf_counter()
+    for index in range(len(matrix) - 1):
+        (matrix[index + 1:] == matrix[index]).mean(axis=1) >= DEFAULT_THRESHOLD
+    return time.perf_counter() - started
+
+
+def run(args):
+    rng = random.Random(7)
+    print(f"Подпись: {NUM_PERM} значений, порог похожести {DEFAULT_THRESHOLD}")
+    for size in args.sizes:
+        listings, groups = make_corpus(size, args.duplicate_share, rng)
+
+        started = time.perf_counter()
+        signatures = [minhash_signature(*listing) for listing in listings]
+        signing = time.perf_counter() - started
+
+        started = time.perf_counter()
+        clusters = near_duplicate_clusters(signatures, [price for _, _, price in listings])
+        clustering = time.perf_counter() - started
+
+        expected, found = duplicate_pairs(groups), duplicate_pairs(clusters.tolist())
+        recall = len(expected & found) / max(len(expected), 1)
+        precision = len(expected & found) / max(len(found), 1)
+        line = (
+            f"{size:>7} объявлений: подписи {signing / size * 1e6:6.1f} мкс/шт, группировка {clustering:6.2f} с, "
+            f"групп {len(set(clusters.tolist()))} (ожидалось {len(set(groups))}), "
+            f"полнота {recall:.3f}, точность {precision:.3f}"
+        )
+        if size <= args.brute_force_limit:
+            line += f", попарно {brute_force_seconds(signatures):.2f} с"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[10000, 50000, 200000]
+    )
+    parser.add_argument('--duplicate-share', type=float, default=0.3, help='доля объявлений, у которых есть копии')
+    parser.add_argument('--brute-force-limit', type=int, default=20000, help='до какого размера сравнивать попарно')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Сравнивает разбор страниц OLX через lxml и через BeautifulSoup.
+
+Каждая страница из benchmarks/fixtures разбирается обоими парсерами; печатается
+среднее время на страницу, пиковая память Python-объектов при разборе и ускорение.
+
+Запуск: python3 benchmarks/bench_parser.py [--rounds N]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from listing_parser import parse_listings, parse_listings_soup  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_pages():
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, 'olx_page_*.html')))
+    if not paths:
+        sys.exit("Нет страниц в benchmarks/fixtures, запустите benchmarks/make_fixtures.py")
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def measure(parse, pages, rounds):
+    """Возвращает (секунд на страницу, пиковая память разбора в байтах, число карточек)."""
+    cards = sum(len(parse(page)) for page in pages)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            parse(page)
+    per_page = (time.perf_counter() - started) / (rounds * len(pages))
+
+    tracemalloc.start()
+    for page in pages:
+        parse(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_page, peak, cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    size = sum(len(page) for page in pages) / len(pages)
+    print(f"Страниц: {len(pages)}, средний размер {size / 1024:.0f} КБ, раундов: {args.rounds}")
+
+    for page in pages:
+        fast = [(l.id, l.title, l.link) for l in parse_listings(page)]
+        slow = [(l.id, l.title, l.link) for l in parse_listings_soup(page)]
+        if fast != slow:
+            sys.exit("Результаты парсеров не совпадают")
+
+    results = {}
+    for name, parse in (('lxml', parse_listings), ('BeautifulSoup', parse_listings_soup)):
+        per_page, peak, cards = measure(parse, pages, args.rounds)
+        results[name] = per_page
+        print(
+            f"{name:>14}: {per_page * 1000:8.2f} мс/стр, "
+            f"{cards / len(pages) / per_page:9.0f} карточек/с, пик памяти Python {peak / 1024:7.0f} КБ"
+        )
+    print(f"Ускорение lxml: x{results['BeautifulSoup'] / results['lxml']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
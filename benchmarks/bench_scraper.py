@@ -0,0 +1,131 @@
+"""Пропускная способность получения объявлений на записанных страницах OLX.
+
+Страницы из benchmarks/fixtures отдаются локальной заглушкой OLX
+(benchmarks/fake_servers.py), а бот берётся из bot.py как есть: каждый раунд
+вызывает ``fetch_olx_listings`` для набора комбинаций поиска с пустыми
+кэшем, хранилищем и состоянием обхода, то есть проходит полный путь
+загрузка → разбор → фильтр по району → сохранение. Печатаются страницы/с,
+карточки/с, задержка вызова и пиковая память процесса бота (RSS); при
+--workers > 0 разбор идёт в отдельных процессах и в RSS бота не попадает.
+
+Запуск: python3 benchmarks/bench_scraper.py [--rounds N] [--combinations N]
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeOlx, serve  # noqa: E402
+from listing_parser import parse_listings  # noqa: E402
+from options import BUDGETS, CATEGORIES, DISTRICTS, ROOMS  # noqa: E402
+from prewarm import iter_search_space  # noqa: E402
+
+
+def peak_rss_mb():
+    # На Linux ru_maxrss измеряется в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def run_round(bot, tmp, round_index, combinations, concurrency):
+    """Один холодный проход по комбинациям; возвращает (задержки вызовов, найдено объявлений)."""
+    # Свежие кэш, хранилище и состояние обхода: каждый вызов идёт на «OLX»
+    bot.listings_cache.clear()
+    bot.crawler = bot.IncrementalCrawler(
+        bot.olx_client, max_pages=bot.crawler.max_pages, locator=bot.district_locator
+    )
+    bot.listing_store = bot.ListingStore(os.path.join(tmp, f'round{round_index}.db'))
+    await bot.listing_store.open()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def fetch(combination):
+        async with semaphore:
+            started = time.perf_counter()
+            listings = await bot.fetch_olx_listings(**bot.search_params(*combination))
+            latencies.append(time.perf_counter() - started)
+            return len(listings)
+
+    found = sum(await asyncio.gather(*(fetch(combination) for combination in combinations)))
+    await bot.listing_store.close()
+    return latencies, found
+
+
+async def run(args):
+    olx = FakeOlx(latency=args.olx_latency / 1000)
+    cards_per_page = {number: len(parse_listings(page)) for number, page in enumerate(olx.pages, 1)}
+    runner, url = await serve(olx)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Окружение задаётся до импорта bot.py: оно читается при создании синглтонов
+        os.environ.update(
+            DB_PATH=os.path.join(tmp, 'bench.db'),
+            OLX_BASE_URL=url,
+            PARSER_WORKERS=str(args.workers),
+        )
+        bot = importlib.import_module('bot')
+        logging.getLogger().setLevel(logging.WARNING)
+
+        combinations = list(itertools.islice(
+            iter_search_space(CATEGORIES, ROOMS, DISTRICTS, BUDGETS), args.combinations
+        ))
+        rss_before = peak_rss_mb()
+
+        # Прогревочный раунд: пул процессов, соединения, импорт lxml
+        await run_round(bot, tmp, 0, combinations[:args.concurrency], args.concurrency)
+        olx.served.clear()
+
+        latencies = []
+        found = 0
+        started = time.perf_counter()
+        for round_index in range(1, args.rounds + 1):
+            round_latencies, round_found = await run_round(
+                bot, tmp, round_index, combinations, args.concurrency
+            )
+            latencies.extend(round_latencies)
+            found += round_found
+        elapsed = time.perf_counter() - started
+
+        await bot.olx_client.close()
+        bot.parser_pool.close()
+    await runner.cleanup()
+
+    pages = sum(olx.served.values())
+    cards = sum(cards_per_page[number] * count for number, count in olx.served.items())
+    latencies.sort()
+    print(f"Комбинаций: {len(combinations)}, раундов: {args.rounds}, параллельно: {args.concurrency}, "
+          f"процессов разбора: {args.workers}, задержка OLX: {args.olx_latency:.0f} мс")
+    print(f"Время: {elapsed:.2f} с")
+    print(f"Страниц: {pages} ({pages / elapsed:.1f} стр/с), карточек: {cards} ({cards / elapsed:.0f} карточек/с)")
+    print(f"Найдено после фильтра по району: {found} ({found / elapsed:.0f} объявлений/с)")
+    print(f"fetch_olx_listings: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+    print(f"Пиковый RSS бота: {peak_rss_mb():.0f} МБ (после импорта {rss_before:.0f} МБ)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--combinations', type=int, default=96, help='комбинаций поиска за раунд')
+    parser.add_argument('--concurrency', type=int, default=8, help='одновременных обходов, как у прогрева')
+    parser.add_argument('--workers', type=int, default=2, help='процессов разбора (0 — в цикле событий)')
+    parser.add_argument('--olx-latency', type=float, default=0.0, help='задержка ответа OLX, мс')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
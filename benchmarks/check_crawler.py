@@ -0,0 +1,91 @@
+"""Проверка восстановления инкрементального обхода после сбоя страницы.
+
+Заглушка клиента OLX отдаёт страницы с валидатором ETag и отвечает 304 на
+первую страницу, если валидатор совпал. После полного первого обхода на
+первой странице появляется новое объявление, а страницы сдвигаются так, что
+инкрементальному обходу нужна вторая страница, но она падает с ошибкой.
+Повторный обход не должен получить 304 по валидатору неудачного обхода:
+он обязан вернуть все объявления выдачи и новые из них.
+
+Запуск: python3 benchmarks/check_crawler.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler import IncrementalCrawler  # noqa: E402
+from listing import Listing  # noqa: E402
+
+PER_PAGE = 5
+
+
+def make_listing(number):
+    return Listing(
+        id=str(number), title=f"Квартира {number}", price=f"{number * 1000} $",
+        link=f"https://www.olx.ua/d/obyavlenie/{number}.html", location="Дніпро, Центральний - Сьогодні о 12:00",
+    )
+
+
+class FlakyClient:
+    """Клиент OLX с изменяемой выдачей и сбоем на выбранной странице."""
+
+    def __init__(self, numbers):
+        self.numbers = numbers
+        self.version = 0
+        self.fail_page = None
+
+    def build_params(self, rooms, budget_min, budget_max, page=1):
+        return {'page': page}
+
+    async def fetch_page_if_modified(self, path, params, etag=None, last_modified=None):
+        page = params['page']
+        current = f'"v{self.version}"'
+        if page == 1 and etag == current:
+            return None, etag, last_modified
+        if page == self.fail_page:
+            raise ConnectionError(f"страница {page} недоступна")
+        start = (page - 1) * PER_PAGE
+        return self.numbers[start:start + PER_PAGE], current, None
+
+    async def parse(self, content):
+        return [make_listing(number) for number in content]
+
+
+async def crawl(crawler):
+    return await crawler.crawl_all('apartment', 'rent', '1_room', 0, 100000)
+
+
+async def run():
+    client = FlakyClient(list(range(20, 5, -1)))
+    crawler = IncrementalCrawler(client, max_pages=3, full_every=100)
+    listings, _ = await crawl(crawler)
+    assert len(listings) == 15, len(listings)
+
+    # Пять новых объявлений занимают всю первую страницу; за ними нужна вторая
+    client.numbers = list(range(25, 5, -1))
+    client.version += 1
+    client.fail_page = 2
+    try:
+        await crawl(crawler)
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("обход должен был упасть на второй странице")
+
+    client.fail_page = None
+    listings, new = await crawl(crawler)
+    ids = sorted(int(listing.id) for listing in listings)
+    new_ids = sorted(int(listing.id) for listing in new)
+    assert ids == list(range(6, 26)), f"после сбоя не хватает объявлений: {ids}"
+    assert new_ids == list(range(21, 26)), f"после сбоя потеряны новые объявления: {new_ids}"
+    print(f"OK: после сбоя второй страницы повторный обход вернул {len(listings)} объявлений, новых {len(new)}")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
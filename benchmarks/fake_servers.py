@@ -0,0 +1,225 @@
+"""Локальные заглушки внешних сервисов для офлайн-бенчмарков.
+
+FakeBotApi отвечает на методы Telegram Bot API, которые использует бот, и
+отдаёт обновления через getUpdates; FakeOlx отдаёт записанные страницы
+результатов OLX из benchmarks/fixtures; FakeCrm принимает выгрузку заявок.
+Заглушки работают на одном aiohttp-приложении, поднятом через ``serve``.
+"""
+import asyncio
+import glob
+import itertools
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'Rieltor', 'username': 'rieltor_bench_bot'}
+
+# Методы, которыми бот отвечает пользователю на очередной шаг
+REPLY_METHODS = ('sendMessage', 'editMessageText')
+
+
+def _form_value(value):
+    # PTB передаёт вложенные объекты (reply_markup, entities) строками JSON
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class FakeBotApi:
+    """Заглушка Telegram Bot API.
+
+    Обновления от имитируемых пользователей ставятся в очередь ``push_*``
+    и забираются ботом через getUpdates. Ответы бота складываются в очередь
+    своего чата, откуда их ждёт генератор нагрузки (``next_reply``).
+    ``latency`` добавляет задержку к каждому вызову, как у настоящего API.
+    """
+
+    def __init__(self, token, latency=0.0):
+        self.token = token
+        self.latency = latency
+        self.calls = Counter()
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._has_updates = asyncio.Event()
+        self._replies = defaultdict(asyncio.Queue)
+
+    def setup(self, app):
+        app.router.add_post(f'/bot{self.token}/{{method}}', self.handle)
+
+    # --- обновления от пользователей -------------------------------------
+
+    @staticmethod
+    def _user(user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+
+    @staticmethod
+    def _chat(chat_id):
+        return {'id': chat_id, 'type': 'private'}
+
+    def _push(self, **payload):
+        self._updates.append({'update_id': next(self._update_ids), **payload})
+        self._has_updates.set()
+
+    def push_command(self, user_id, command):
+        text = '/' + command
+        self._push(message={
+            'message_id': next(self._message_ids), 'date': int(time.time()),
+            'chat': self._chat(user_id), 'from': self._user(user_id), 'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+        })
+
+    def push_callback(self, user_id, data, message):
+        """Нажатие инлайн-кнопки под сообщением бота ``message``."""
+        self._push(callback_query={
+            'id': str(next(self._update_ids)), 'from': self._user(user_id),
+            'chat_instance': str(user_id), 'data': data, 'message': message,
+        })
+
+    def push_contact(self, user_id, phone_number):
+        self._push(message={
+            'message_id': next(self._message_ids), 'date': int(time.time()),
+            'chat': self._chat(user_id), 'from': self._user(user_id),
+            'contact': {'phone_number': phone_number, 'first_name': f'User{user_id}', 'user_id': user_id},
+        })
+
+    async def next_reply(self, chat_id, timeout):
+        """Ждёт следующий ответ бота в чат: ``(метод, отправленное сообщение)``."""
+        return await asyncio.wait_for(self._replies[chat_id].get(), timeout)
+
+    # --- методы Bot API --------------------------------------------------
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        params = {key: _form_value(value) for key, value in (await request.post()).items()}
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            result = await self._get_updates(params)
+        else:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            result = self._answer(method, params)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get('limit') or 100)]
+
+    def _answer(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method not in REPLY_METHODS:
+            return True
+        chat_id = int(params['chat_id'])
+        message = {
+            'message_id': int(params['message_id']) if 'message_id' in params else next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+        # В сообщении Telegram возвращает только инлайн-клавиатуру
+        markup = params.get('reply_markup')
+        if isinstance(markup, dict) and 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        self._replies[chat_id].put_nowait((method, message))
+        return message
+
+
+class FakeOlx:
+    """Заглушка OLX: отдаёт записанные страницы результатов.
+
+    Номер страницы берётся из параметра ``page``; за пределами записанных
+    страниц отдаётся страница без объявлений, на которой обход заканчивается.
+    ``latency`` добавляет задержку к каждому ответу, как у настоящей сети.
+    """
+
+    EMPTY_PAGE = b'<html><body><div data-testid="listing-grid"></div></body></html>'
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency=0.0):
+        self.latency = latency
+        self.pages = []
+        for path in sorted(glob.glob(os.path.join(fixtures_dir, 'olx_page_*.html'))):
+            with open(path, 'rb') as f:
+                self.pages.append(f.read())
+        if not self.pages:
+            raise RuntimeError("Нет страниц в benchmarks/fixtures, запустите benchmarks/make_fixtures.py")
+        self.requests = 0
+        # Сколько раз отдана каждая записанная страница (по номеру)
+        self.served = Counter()
+
+    def setup(self, app):
+        app.router.add_get('/d/{path:.*}', self.handle)
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        page = int(request.query.get('page', '1'))
+        if page > len(self.pages):
+            return web.Response(body=self.EMPTY_PAGE, content_type='text/html', charset='utf-8')
+        self.served[page] += 1
+        body = self.pages[page - 1]
+        return web.Response(body=body, content_type='text/html', charset='utf-8')
+
+
+async def serve(*stand_ins, host='127.0.0.1', port=0):
+    """Поднимает заглушки на одном HTTP-сервере; возвращает (runner, базовый URL)."""
+    app = web.Application()
+    for stand_in in stand_ins:
+        stand_in.setup(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://{host}:{port}'
+
+
+class FakeCrm:
+    """Заглушка HTTP-приёмника CRM для выгрузки заявок.
+
+    Принимает пачки ``{"leads": [...]}``, запоминает uid заявок и считает
+    повторно присланные. С вероятностью ``failure_rate`` отвечает 503, чтобы
+    проверить повторы.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=2024):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.uids = set()
+        self.batches = 0
+        self.duplicates = 0
+        self.failures = 0
+
+    def setup(self, app):
+        app.router.add_post('/crm/leads', self.handle)
+
+    async def handle(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            return web.Response(status=503, text='temporarily unavailable')
+        payload = await request.json()
+        self.batches += 1
+        for lead in payload['leads']:
+            if lead['uid'] in self.uids:
+                self.duplicates += 1
+            self.uids.add(lead['uid'])
+        return web.json_response({'accepted': len(payload['leads'])})
@@ -0,0 +1,111 @@
+"""Генерирует страницы результатов в разметке OLX для офлайн-бенчмарков.
+
+Страницы детерминированы (фиксированный seed), повторяют структуру карточек
+OLX и содержат типичный «шум» реальной страницы: навигацию, стили и крупный
+встроенный JSON состояния приложения.
+
+Запуск: python3 benchmarks/make_fixtures.py
+"""
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+PAGES = 3
+CARDS_PER_PAGE = 40
+
+KINDS = ['квартира', 'квартиру', 'будинок', 'смарт-квартира']
+ROOMS = ['1-кімнатна', '2-кімнатна', '3-кімнатна', '4-кімнатна']
+FEATURES = ['з ремонтом', 'біля метро', 'новобудова', 'від власника', 'з меблями', 'панорамні вікна']
+DISTRICTS = ['Центральний', 'Соборний', 'Шевченківський', 'Чечелівський', 'Новокодацький', 'Індустріальний']
+STREETS = ['пр. Яворницького', 'вул. Січеславська Набережна', 'вул. Гоголя', 'пр. Гагаріна', 'вул. Робоча']
+
+# Границы Дніпра для точек карты объявлений (широта, долгота)
+CITY_BOUNDS = ((48.38, 34.88), (48.56, 35.20))
+
+
+def make_card(rng, listing_id):
+    title = f"{rng.choice(ROOMS)} {rng.choice(KINDS)}, {rng.choice(FEATURES)}, {rng.choice(STREETS)}"
+    price = f"{rng.randrange(8, 160) * 500:,}".replace(',', ' ')
+    district = rng.choice(DISTRICTS)
+    href = f"/d/uk/obyavlenie/{listing_id}-ID{listing_id:x}.html"
+    negotiable = '<span class="css-1vxklie">Договірна</span>' if rng.random() < 0.3 else ''
+    return f"""
+<div data-cy="l-card" data-testid="l-card" id="{listing_id}" class="css-1sw7q4x">
+  <div class="css-1apmciz" type="list">
+    <div class="css-qfzx1y">
+      <a class="css-z3gu2d" href="{href}">
+        <div class="css-gl6djm"><div type="list" class="css-1ut25fa">
+          <img src="https://ireland.apollo.olxcdn.com/v1/files/{listing_id:x}/image;s=216x152" alt="{title}" class="css-8wsg1m">
+        </div></div>
+      </a>
+    </div>
+    <div class="css-u2ayx9">
+      <div data-cy="ad-card-title" class="css-u2ayx9">
+        <a class="css-z3gu2d" href="{href}"><h4 class="css-1s3qyje">{title}</h4></a>
+        <p data-testid="ad-price" class="css-13afqrm">{price} $ {negotiable}</p>
+      </div>
+    </div>
+    <div class="css-odp1qd">
+      <p data-testid="location-date" class="css-1mwdrlh">Дніпро, {district} - {rng.randrange(1, 28)} жовтня 2024 р.</p>
+      <div class="css-1kfqt7f"><span class="css-643j0o">{rng.randrange(25, 180)} м²</span></div>
+    </div>
+  </div>
+</div>"""
+
+
+def make_point(rng):
+    (lat_min, lon_min), (lat_max, lon_max) = CITY_BOUNDS
+    return {'zoom': 13, 'lat': round(rng.uniform(lat_min, lat_max), 6), 'lon': round(rng.uniform(lon_min, lon_max), 6)}
+
+
+def make_page(rng, page):
+    cards = [make_card(rng, 800000000 + page * 1000 + i) for i in range(CARDS_PER_PAGE)]
+    # Отдельный генератор для точек, чтобы не менять остальное содержимое страниц
+    map_rng = random.Random(page)
+    state = {
+        'listing': {
+            'ads': [
+                {
+                    'id': 800000000 + page * 1000 + i,
+                    'description': ' '.join(rng.choice(FEATURES) for _ in range(40)),
+                    'map': make_point(map_rng),
+                }
+                for i in range(CARDS_PER_PAGE)
+            ]
+        }
+    }
+    nav = ''.join(f'<li class="css-nav"><a href="/d/uk/{i}/">Розділ {i}</a></li>' for i in range(150))
+    return f"""<!DOCTYPE html>
+<html lang="uk">
+<head>
+<meta charset="utf-8">
+<title>Нерухомість у Дніпрі - OLX.ua</title>
+<style>{'.css-x{display:flex;margin:0 auto;}' * 200}</style>
+</head>
+<body>
+<header><nav><ul>{nav}</ul></nav></header>
+<main>
+<div data-testid="listing-grid" class="css-oukcj3">
+{''.join(cards)}
+</div>
+</main>
+<script>window.__PRERENDERED_STATE__ = {json.dumps(json.dumps(state, ensure_ascii=False), ensure_ascii=False)};</script>
+</body>
+</html>
+"""
+
+
+def main():
+    rng = random.Random(2024)
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for page in range(1, PAGES + 1):
+        path = os.path.join(FIXTURES_DIR, f'olx_page_{page}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(make_page(rng, page))
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
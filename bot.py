@@ -1,7 +1,18 @@
+import asyncio
+import fcntl
 import logging
 import os
+import re
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove
+)
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -11,8 +22,45 @@ from telegram.ext import (
     ConversationHandler,
     ContextTypes
 )
-import requests
-from bs4 import BeautifulSoup
+from telegram.helpers import escape_markdown
+
+from agents import LeadNotifier, parse_agent_chats
+from cache import TTLCache, make_search_key
+from crawler import IncrementalCrawler
+from crm import CrmSync, make_sink
+from dedup import dedupe
+from dispatcher import ChatOrderedApplication
+from geo import DistrictLocator, GeoIndex, load_districts
+from leads import Lead, LeadPipeline
+from listing import release_signatures
+from listing_parser import OLX_BASE_URL
+from metrics import (
+    LOOKUP_LATENCY,
+    REGISTRY,
+    SCRAPE_LATENCY,
+    Gauge,
+    InstrumentedRequest,
+    instrument_handler,
+    start_metrics_server
+)
+from olx import OlxClient
+from options import (
+    BUDGETS,
+    CATEGORIES,
+    DISTRICTS,
+    PAYMENTS,
+    RENOVATIONS,
+    ROOMS,
+    budget_range
+)
+from outbox import BULK, INTERACTIVE, MessageOutbox
+from persistence import SQLitePersistence
+from prewarm import ListingPrewarmer, iter_search_space
+from ranking import ListingIndex
+from storage import ListingStore
+from subscriptions import SubscriptionRegistry
+from webhook import WebhookServer, run_webhook
+from workers import ParserPool
 
 # Загрузка переменных окружения из .env
 load_dotenv()
@@ -28,88 +76,6 @@ logger = logging.getLogger(__name__)
 # Определяем состояния разговора
 CHOOSING, TYPING_ROOMS, TYPING_DISTRICT, TYPING_RENOVATION, TYPING_BUDGET, TYPING_PAYMENT, TYPING_CONTACT = range(7)
 
-# Определяем кнопки выбора категории
-category_keyboard = [
-    [
-        InlineKeyboardButton("Аренда квартиры", callback_data='rent_apartment'),
-        InlineKeyboardButton("Покупка квартиры", callback_data='buy_apartment')
-    ],
-    [
-        InlineKeyboardButton("Аренда дома", callback_data='rent_house'),
-        InlineKeyboardButton("Покупка дома", callback_data='buy_house')
-    ]
-]
-category_markup = InlineKeyboardMarkup(category_keyboard)
-
-# Определяем кнопки выбора количества комнат
-rooms_keyboard = [
-    [
-        InlineKeyboardButton("1 комната", callback_data='1_room'),
-        InlineKeyboardButton("2 комнаты", callback_data='2_rooms')
-    ],
-    [
-        InlineKeyboardButton("3 комнаты", callback_data='3_rooms'),
-        InlineKeyboardButton("4 и более комнат", callback_data='4_plus_rooms')
-    ]
-]
-rooms_markup = InlineKeyboardMarkup(rooms_keyboard)
-
-# Определяем кнопки выбора района города Днепр
-district_keyboard = [
-    [
-        InlineKeyboardButton("Центральный", callback_data='central_district'),
-        InlineKeyboardButton("Днепропетровский", callback_data='dnepropetrovsk_district')
-    ],
-    [
-        InlineKeyboardButton("Жовтневый", callback_data='zhovtnevyi_district'),
-        InlineKeyboardButton("Соборный", callback_data='sobornyi_district')
-    ],
-    [
-        InlineKeyboardButton("Ломоносовский", callback_data='lomonosovskyi_district'),
-        InlineKeyboardButton("Партизанский", callback_data='partyzanskyi_district')
-    ]
-]
-district_markup = InlineKeyboardMarkup(district_keyboard)
-
-# Определяем кнопки выбора типа ремонта
-renovation_keyboard = [
-    [
-        InlineKeyboardButton("Косметический", callback_data='cosmetic_renovation'),
-        InlineKeyboardButton("Капитальный", callback_data='capital_renovation')
-    ],
-    [
-        InlineKeyboardButton("Дизайнерский", callback_data='designer_renovation'),
-        InlineKeyboardButton("Не требуется", callback_data='no_renovation')
-    ]
-]
-renovation_markup = InlineKeyboardMarkup(renovation_keyboard)
-
-# Определяем кнопки выбора бюджета
-budget_keyboard = [
-    [
-        InlineKeyboardButton("До 10 000$", callback_data='budget_under_10k'),
-        InlineKeyboardButton("10 000$ - 20 000$", callback_data='budget_10k_20k')
-    ],
-    [
-        InlineKeyboardButton("20 000$ - 30 000$", callback_data='budget_20k_30k'),
-        InlineKeyboardButton("Более 30 000$", callback_data='budget_over_30k')
-    ]
-]
-budget_markup = InlineKeyboardMarkup(budget_keyboard)
-
-# Определяем кнопки выбора способа оплаты
-payment_keyboard = [
-    [
-        InlineKeyboardButton("Наличные", callback_data='payment_cash'),
-        InlineKeyboardButton("Рассрочка", callback_data='payment_installment')
-    ],
-    [
-        InlineKeyboardButton("Ипотека", callback_data='payment_mortgage'),
-        InlineKeyboardButton("Не определился", callback_data='payment_unsure')
-    ]
-]
-payment_markup = InlineKeyboardMarkup(payment_keyboard)
-
 # Определяем кнопку для запроса контакта
 contact_keyboard = ReplyKeyboardMarkup(
     [[KeyboardButton("Отправить контакт", request_contact=True)]],
@@ -117,25 +83,294 @@ contact_keyboard = ReplyKeyboardMarkup(
     one_time_keyboard=True
 )
 
-def fetch_olx_listings(category, transaction, rooms, district, budget_min, budget_max):
+# Разбор страниц OLX выполняется в отдельных процессах, чтобы не тормозить обработчики
+parser_pool = ParserPool(max_workers=int(os.getenv('PARSER_WORKERS', '2')))
+
+# Общий клиент OLX: один пул соединений на весь процесс
+olx_client = OlxClient(
+    base_url=os.getenv('OLX_BASE_URL', OLX_BASE_URL),
+    max_connections=int(os.getenv('OLX_MAX_CONNECTIONS', '100')),
+    max_per_host=int(os.getenv('OLX_MAX_PER_HOST', '8')),
+    timeout=float(os.getenv('OLX_TIMEOUT', '15')),
+    parser_pool=parser_pool
+)
+
+# Определение района объявления по строке местоположения. Если задан
+# DISTRICTS_GEOJSON с настоящими контурами районов, объявления без района в
+# строке дополнительно определяются по точке на карте; без него — только по тексту
+DISTRICTS_GEOJSON = os.getenv('DISTRICTS_GEOJSON')
+district_locator = DistrictLocator(load_districts(DISTRICTS_GEOJSON) if DISTRICTS_GEOJSON else [])
+
+# Инкрементальный обход: повторное обновление комбинации стоит одну-две страницы
+crawler = IncrementalCrawler(
+    olx_client,
+    max_pages=int(os.getenv('CRAWL_MAX_PAGES', '5')),
+    full_every=int(os.getenv('CRAWL_FULL_EVERY', '6')),
+    locator=district_locator
+)
+
+# Кэш результатов поиска: комбинаций параметров немного, поэтому повторные
+# запросы почти всегда обслуживаются из памяти
+listings_cache = TTLCache(
+    maxsize=int(os.getenv('LISTINGS_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('LISTINGS_CACHE_TTL', '1800')),
+)
+
+# Готовые Markdown-блоки объявлений: одинаковые результаты поиска не
+# форматируются заново для каждого пользователя. Ключ — поиск и версия его
+# объявлений: номер перестройки индекса и счётчик записей в хранилище по
+# (категория, сделка, комнаты, район), так что запись одного поиска не
+# сбрасывает готовые блоки остальных
+index_generation = 0
+listing_versions = {}
+rendered_listings = TTLCache(
+    maxsize=int(os.getenv('RENDER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('LISTINGS_CACHE_TTL', '1800')),
+)
+
+# Локальное хранилище объявлений, переживающее перезапуски бота
+listing_store = ListingStore(os.getenv('DB_PATH', 'rieltor.db'))
+
+# Очередь исходящих сообщений с учётом лимитов Telegram
+outbox = MessageOutbox(
+    global_rate=float(os.getenv('OUTBOX_GLOBAL_RATE', '30')),
+    chat_rate=float(os.getenv('OUTBOX_CHAT_RATE', '1'))
+)
+
+# Заявки пользователей: пишутся в базу пачками в фоне
+leads = LeadPipeline(
+    os.getenv('DB_PATH', 'rieltor.db'),
+    batch_size=int(os.getenv('LEAD_BATCH_SIZE', '100')),
+    linger=float(os.getenv('LEAD_LINGER', '0.05'))
+)
+
+# Уведомления агентов о новых заявках: чаты по районам (AGENT_CHATS) или общий
+# чат сотрудников (STAFF_CHAT_ID); заявки за окно собираются в один дайджест
+lead_notifier = LeadNotifier(
+    outbox,
+    routes=parse_agent_chats(os.getenv('AGENT_CHATS')),
+    staff_chat_id=int(os.getenv('STAFF_CHAT_ID')) if os.getenv('STAFF_CHAT_ID') else None,
+    window=float(os.getenv('LEAD_DIGEST_WINDOW', '10'))
+)
+
+# Выгрузка заявок в CRM: CRM_SINK задаёт приёмник (jsonl:каталог, csv:каталог
+# или URL для POST); без него выгрузка выключена
+crm_sync = None
+if os.getenv('CRM_SINK'):
+    crm_sync = CrmSync(
+        os.getenv('DB_PATH', 'rieltor.db'),
+        make_sink(os.getenv('CRM_SINK'), token=os.getenv('CRM_TOKEN')),
+        batch_size=int(os.getenv('CRM_BATCH_SIZE', '500'))
+    )
+
+# Подписки пользователей на новые объявления по их поиску
+subscriptions = SubscriptionRegistry(os.getenv('DB_PATH', 'rieltor.db'))
+
+# Колоночный индекс всех объявлений из хранилища для фильтрации и ранжирования;
+# перестраивается после каждого прогрева
+listing_index = ListingIndex([])
+
+# Сеточный индекс объявлений с координатами для поиска рядом с точкой;
+# строится по тому же корпусу, что и индекс ранжирования
+geo_index = GeoIndex([])
+
+# Радиус поиска объявлений рядом с присланной точкой, м
+NEARBY_RADIUS = float(os.getenv('NEARBY_RADIUS', '2000'))
+
+# Планировщик фоновых задач (прогрев кэша объявлений)
+scheduler = AsyncIOScheduler()
+
+# HTTP-сервер с метриками для Prometheus; запускается вместе с ботом
+metrics_runner = None
+
+def search_params(choice, rooms, district, budget):
+    """Преобразует ответы мастера в параметры поиска OLX."""
+    return dict(
+        category='apartment' if 'apartment' in choice else 'house',
+        transaction='rent' if 'rent' in choice else 'buy',
+        rooms=rooms,
+        district=district,
+        budget_min=budget_min_val(budget),
+        budget_max=budget_max_val(budget)
+    )
+
+async def publish_crawl(params, listings, new_listings):
+    """Раскладывает результат обхода выдачи OLX по районам.
+
+    ``params`` — параметры поиска без района: район в запрос к OLX не входит,
+    поэтому одна выдача обновляет хранилище и кэш каждого района, а новые
+    объявления рассылаются подписчикам своего района. После этого подписи
+    MinHash объявлений больше не нужны и отбрасываются.
+    """
+    for district in DISTRICTS.keys:
+        district_params = dict(params, district=district)
+        await store_listings(
+            district_params, [listing for listing in listings if crawler.matches_district(listing, district)]
+        )
+        notify_subscribers(
+            district_params, [listing for listing in new_listings if crawler.matches_district(listing, district)]
+        )
+    release_signatures(listings)
+
+def notify_subscribers(params, new_listings):
+    """Рассылает новые объявления района подписчикам его поиска."""
+    if not new_listings:
+        return
+    matches = subscriptions.match(
+        params['category'], params['transaction'], params['district'], params['rooms'], new_listings
+    )
+    for user_id, listings in matches.items():
+        text = "🔔 Новые объявления по вашей подписке:\n\n" + format_listings(dedupe(listings)[:5])
+        outbox.send_message(user_id, text, priority=BULK, parse_mode='Markdown', disable_web_page_preview=True)
+
+async def refresh_and_notify(choice, rooms, budget):
+    """Заново обходит выдачу для ответов мастера и рассылает новые объявления подписчикам."""
+    params = search_params(choice, rooms, None, budget)
+    del params['district']
+    with SCRAPE_LATENCY.time(source='prewarm'):
+        listings, new_listings = await crawler.crawl_all(**params)
+    await publish_crawl(params, listings, new_listings)
+
+# Служебные символы Markdown (первой версии), которые экранируются в текстах с OLX
+MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+def bold_markdown(text):
+    """Выделяет текст жирным, экранируя служебные символы Markdown.
+
+    Внутри выделения экранировать нельзя, поэтому выделение закрывается
+    перед каждым служебным символом и открывается снова после него.
+    """
+    return "".join(
+        escape_markdown(part, version=1) if MARKDOWN_SPECIAL.fullmatch(part) else f"*{part}*"
+        for part in MARKDOWN_SPECIAL.split(text) if part
+    )
+
+def format_listings(listings):
+    """Форматирует объявления для сообщения в Markdown.
+
+    Заголовок и цена приходят с OLX как есть, поэтому служебные символы
+    Markdown в них экранируются: иначе Telegram отклонит всё сообщение.
+    """
+    return "".join(
+        f"• {bold_markdown(listing.title)}\n"
+        f"  Цена: {escape_markdown(listing.price, version=1)}\n"
+        f"  [Подробнее]({listing.link})\n\n"
+        for listing in listings
+    )
+
+def listing_group(params):
+    """Часть ключа поиска, по которой объявления лежат в хранилище (без бюджета)."""
+    return make_search_key(**params)[:4]
+
+def listings_version(params):
+    """Версия объявлений поиска: меняется при перестройке индекса и записи в хранилище."""
+    return index_generation, listing_versions.get(listing_group(params), 0)
+
+def render_listings(search_key, params, version, listings):
+    """Возвращает Markdown-блок объявлений поиска, форматируя его один раз на версию.
+
+    ``version`` — значение ``listings_version(params)`` до получения
+    объявлений: если оно успело смениться, блок форматируется без кэша.
+    """
+    if version != listings_version(params):
+        return format_listings(listings)
+    key = (search_key, version)
+    block = rendered_listings.get(key)
+    if block is None:
+        block = format_listings(listings)
+        rendered_listings.set(key, block)
+    return block
+
+async def store_listings(params, listings):
+    """Сохраняет результаты поиска в хранилище и кэш."""
+    await listing_store.upsert_many(
+        params['category'], params['transaction'], params['rooms'], params['district'], listings
+    )
+    listings_cache.set(make_search_key(**params), listings)
+    group = listing_group(params)
+    listing_versions[group] = listing_versions.get(group, 0) + 1
+
+def build_indexes(corpus):
+    """Строит индекс ранжирования и геоиндекс по одному корпусу."""
+    index = ListingIndex(corpus)
+    return index, GeoIndex(index.records)
+
+async def rebuild_listing_index():
+    """Перестраивает индексы по текущему содержимому хранилища.
+
+    Индексы строятся в отдельном потоке, а обработчики до замены продолжают
+    пользоваться прежними.
+    """
+    global listing_index, geo_index, index_generation
+    corpus = await listing_store.load_corpus()
+    listing_index, geo_index = await asyncio.to_thread(build_indexes, corpus)
+    index_generation += 1
+    logger.info(
+        "Индекс ранжирования перестроен: %d объявлений, с координатами %d", len(listing_index), len(geo_index)
+    )
+
+async def find_listings(choice, rooms, district, renovation, budget, limit=5):
+    """Возвращает лучшие объявления для ответов мастера."""
+    params = search_params(choice, rooms, district, budget)
+    with LOOKUP_LATENCY.time(source='index'):
+        listings = listing_index.top(renovation=renovation, k=limit, **params)
+    if listings:
+        return listings
+    # Индекс ещё пуст или не знает эту комбинацию — идём по обычному пути
+    listings = await fetch_olx_listings(**params)
+    return dedupe(listings)[:limit]
+
+async def fetch_olx_listings(category, transaction, rooms, district, budget_min, budget_max):
     """
     Функция для получения объявлений с OLX на основе заданных параметров.
     """
-    # Здесь должен быть ваш код скрейпинга OLX
-    # Для примера вернём пустой список
-    return []
+    params = dict(
+        category=category, transaction=transaction, rooms=rooms,
+        district=district, budget_min=budget_min, budget_max=budget_max
+    )
+    key = make_search_key(**params)
+    with LOOKUP_LATENCY.time(source='cache'):
+        listings = listings_cache.get(key)
+    if listings is not None:
+        return listings
+
+    # Сначала ищем в локальном хранилище, и только потом идём на OLX
+    with LOOKUP_LATENCY.time(source='store'):
+        listings = await listing_store.search(**params)
+    if listings:
+        listings_cache.set(key, listings)
+        return listings
+
+    # Обход выдачи обновляет все районы сразу, и найденные при нём новые
+    # объявления уходят подписчикам так же, как при фоновом прогреве
+    search = dict(params)
+    del search['district']
+    try:
+        with SCRAPE_LATENCY.time(source='live'):
+            listings, new_listings = await crawler.crawl_all(**search)
+    except Exception:
+        logger.exception("Не удалось получить объявления с OLX")
+        return []
+
+    district_listings = [listing for listing in listings if crawler.matches_district(listing, district)]
+    if district not in DISTRICTS:
+        await store_listings(params, district_listings)
+    await publish_crawl(search, listings, new_listings)
+    return district_listings
 
 # Обработчик команды /start
+@instrument_handler('start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет приветственное сообщение с инлайн-кнопками выбора категории."""
     user_first_name = update.effective_user.first_name
     await update.message.reply_text(
         f"Здравствуйте, {user_first_name}! Чем я могу вам помочь?",
-        reply_markup=category_markup
+        reply_markup=CATEGORIES.markup
     )
     return CHOOSING
 
 # Обработчик нажатий на инлайн-кнопки категории
+@instrument_handler('category')
 async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор категории и запрашивает количество комнат."""
     query = update.callback_query
@@ -145,10 +380,11 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['choice'] = choice  # Сохраняем выбор пользователя
 
     # Отправляем вопрос о количестве комнат с соответствующими кнопками
-    await query.edit_message_text(text="Сколько комнат вас интересует?", reply_markup=rooms_markup)
+    await query.edit_message_text(text="Сколько комнат вас интересует?", reply_markup=ROOMS.markup)
     return TYPING_ROOMS
 
 # Обработчик нажатий на инлайн-кнопки количества комнат
+@instrument_handler('rooms')
 async def rooms_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор количества комнат и запрашивает район."""
     query = update.callback_query
@@ -158,10 +394,11 @@ async def rooms_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['rooms'] = rooms_choice  # Сохраняем выбор пользователя
 
     # Отправляем вопрос о районе с соответствующими кнопками
-    await query.edit_message_text(text="Укажите, пожалуйста, район города Днепр:", reply_markup=district_markup)
+    await query.edit_message_text(text="Укажите, пожалуйста, район города Днепр:", reply_markup=DISTRICTS.markup)
     return TYPING_DISTRICT
 
 # Обработчик нажатий на инлайн-кнопки района
+@instrument_handler('district')
 async def district_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор района и запрашивает тип ремонта."""
     query = update.callback_query
@@ -171,10 +408,11 @@ async def district_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['district'] = district_choice  # Сохраняем выбор пользователя
 
     # Отправляем вопрос о типе ремонта с соответствующими кнопками
-    await query.edit_message_text(text="Какой тип ремонта вас интересует?", reply_markup=renovation_markup)
+    await query.edit_message_text(text="Какой тип ремонта вас интересует?", reply_markup=RENOVATIONS.markup)
     return TYPING_RENOVATION
 
 # Обработчик нажатий на инлайн-кнопки типа ремонта
+@instrument_handler('renovation')
 async def renovation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор типа ремонта и запрашивает бюджет."""
     query = update.callback_query
@@ -184,10 +422,11 @@ async def renovation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     context.user_data['renovation'] = renovation_choice  # Сохраняем выбор пользователя
 
     # Отправляем вопрос о бюджете с соответствующими кнопками
-    await query.edit_message_text(text="Какой ваш бюджет на проект?", reply_markup=budget_markup)
+    await query.edit_message_text(text="Какой ваш бюджет на проект?", reply_markup=BUDGETS.markup)
     return TYPING_BUDGET
 
 # Обработчик нажатий на инлайн-кнопки бюджета
+@instrument_handler('budget')
 async def budget_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор бюджета и запрашивает способ оплаты."""
     query = update.callback_query
@@ -199,11 +438,12 @@ async def budget_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Отправляем вопрос о способе оплаты с соответствующими кнопками
     await query.edit_message_text(
         text="Какой способ оплаты вы предпочитаете?",
-        reply_markup=payment_markup
+        reply_markup=PAYMENTS.markup
     )
     return TYPING_PAYMENT
 
 # Обработчик нажатий на инлайн-кнопки способа оплаты
+@instrument_handler('payment')
 async def payment_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает выбор способа оплаты и запрашивает контактные данные."""
     query = update.callback_query
@@ -220,6 +460,7 @@ async def payment_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return TYPING_CONTACT
 
 # Обработчик получения контактных данных
+@instrument_handler('contact')
 async def received_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает полученные контактные данные и завершает разговор."""
     contact = update.message.contact
@@ -237,87 +478,114 @@ async def received_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     payment = context.user_data.get('payment', 'не указан')
 
     # Преобразуем данные для удобного отображения
-    choice_mapping = {
-        'rent_apartment': "Аренда квартиры",
-        'buy_apartment': "Покупка квартиры",
-        'rent_house': "Аренда дома",
-        'buy_house': "Покупка дома"
-    }
-    rooms_mapping = {
-        '1_room': "1 комната",
-        '2_rooms': "2 комнаты",
-        '3_rooms': "3 комнаты",
-        '4_plus_rooms': "4 и более комнат"
-    }
-    district_mapping = {
-        'central_district': "Центральный",
-        'dnepropetrovsk_district': "Днепропетровский",
-        'zhovtnevyi_district': "Жовтневый",
-        'sobornyi_district': "Соборный",
-        'lomonosovskyi_district': "Ломоносовский",
-        'partyzanskyi_district': "Партизанский"
-    }
-    renovation_mapping = {
-        'cosmetic_renovation': "Косметический",
-        'capital_renovation': "Капитальный",
-        'designer_renovation': "Дизайнерский",
-        'no_renovation': "Не требуется"
-    }
-    budget_mapping = {
-        'budget_under_10k': "До 10 000$",
-        'budget_10k_20k': "10 000$ - 20 000$",
-        'budget_20k_30k': "20 000$ - 30 000$",
-        'budget_over_30k': "Более 30 000$"
-    }
-    payment_mapping = {
-        'payment_cash': "Наличные",
-        'payment_installment': "Рассрочка",
-        'payment_mortgage': "Ипотека",
-        'payment_unsure': "Не определился"
-    }
-
-    selected_choice = choice_mapping.get(choice, "Неизвестный выбор")
-    selected_rooms = rooms_mapping.get(rooms, "Не указано")
-    selected_district = district_mapping.get(district, "Не указан")
-    selected_renovation = renovation_mapping.get(renovation, "Не указан")
-    selected_budget = budget_mapping.get(budget, "Не указан")
-    selected_payment = payment_mapping.get(payment, "Не указан")
+    selected_choice = CATEGORIES.label(choice, "Неизвестный выбор")
+    selected_rooms = ROOMS.label(rooms, "Не указано")
+    selected_district = DISTRICTS.label(district, "Не указан")
+    selected_renovation = RENOVATIONS.label(renovation, "Не указан")
+    selected_budget = BUDGETS.label(budget, "Не указан")
+    selected_payment = PAYMENTS.label(payment, "Не указан")
+
+    # Сохраняем заявку: она только ставится в очередь и не задерживает ответ
+    chat_id = update.effective_chat.id
+    lead = Lead(
+        user_id=update.effective_user.id,
+        chat_id=chat_id,
+        category=choice,
+        rooms=context.user_data.get('rooms'),
+        district=context.user_data.get('district'),
+        renovation=context.user_data.get('renovation'),
+        budget=context.user_data.get('budget'),
+        payment=context.user_data.get('payment'),
+        contact=user_contact
+    )
+    await leads.submit(lead)
+    # Сообщаем агентам района о новой заявке
+    lead_notifier.notify(lead)
 
     # Получаем объявления с OLX
-    listings = fetch_olx_listings(
-        category='apartment' if 'apartment' in choice else 'house',
-        transaction='rent' if 'rent' in choice else 'buy',
-        rooms=rooms,
-        district=district,
-        budget_min=budget_min_val(budget),
-        budget_max=budget_max_val(budget)
-    )
+    params = search_params(choice, rooms, district, budget)
+    version = listings_version(params)
+    listings = await find_listings(choice, rooms, district, renovation, budget)
 
     if not listings:
         olx_message = "К сожалению, не удалось найти подходящие объявления на OLX."
     else:
-        olx_message = "Вот некоторые подходящие объявления с OLX:\n\n"
-        for listing in listings[:5]:  # Ограничиваем до 5 объявлений
-            olx_message += f"• *{listing['title']}*\n  Цена: {listing['price']}\n  [Подробнее]({listing['link']})\n\n"
-
-    final_response = (
-        f"Спасибо за предоставленную информацию!\n\n"
-        f"**Категория:** {selected_choice}\n"
-        f"**Количество комнат:** {selected_rooms}\n"
-        f"**Район:** {selected_district}\n"
-        f"**Тип ремонта:** {selected_renovation}\n"
-        f"**Бюджет:** {selected_budget}\n"
-        f"**Способ оплаты:** {selected_payment}\n"
-        f"**Контакт:** {user_contact}\n\n"
-        f"{olx_message}"
-        f"Мы свяжемся с вами в ближайшее время."
+        # Блок объявлений общий для всех с тем же поиском и берётся из кэша
+        search_key = (choice, rooms, district, renovation, budget)
+        olx_message = "Вот некоторые подходящие объявления с OLX:\n\n" + render_listings(search_key, params, version, listings)
+
+    # Для каждого пользователя форматируется только шапка с его ответами
+    final_response = "".join((
+        "Спасибо за предоставленную информацию!\n\n",
+        f"**Категория:** {selected_choice}\n",
+        f"**Количество комнат:** {selected_rooms}\n",
+        f"**Район:** {selected_district}\n",
+        f"**Тип ремонта:** {selected_renovation}\n",
+        f"**Бюджет:** {selected_budget}\n",
+        f"**Способ оплаты:** {selected_payment}\n",
+        f"**Контакт:** {user_contact}\n\n",
+        olx_message,
+        "Мы свяжемся с вами в ближайшее время.",
+    ))
+
+    # Отправляем итоговое сообщение через общую очередь в приоритетной полосе
+    await outbox.send_message(
+        chat_id, final_response, priority=INTERACTIVE,
+        parse_mode='Markdown', disable_web_page_preview=True, reply_markup=ReplyKeyboardRemove()
     )
 
-    # Отправляем итоговое сообщение
-    await update.message.reply_text(final_response, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=ReplyKeyboardRemove())
+    # Предлагаем подписаться на новые объявления по этому поиску; сообщение
+    # только ставится в очередь, чтобы не ждать лимита в 1 сообщение/с на чат
+    if choice in CATEGORIES and rooms in ROOMS and district in DISTRICTS and budget in BUDGETS:
+        outbox.send_message(
+            chat_id, "Хотите получать новые объявления по этому поиску?", priority=INTERACTIVE,
+            reply_markup=subscribe_markup(choice, rooms, district, budget)
+        )
 
     return ConversationHandler.END
 
+def subscribe_markup(choice, rooms, district, budget):
+    """Возвращает кнопку подписки на поиск."""
+    # Поиск кодируется индексами вариантов, чтобы уложиться в 64 байта callback_data
+    callback_data = 'subscribe:{}:{}:{}:{}'.format(
+        CATEGORIES.keys.index(choice),
+        ROOMS.keys.index(rooms),
+        DISTRICTS.keys.index(district),
+        BUDGETS.keys.index(budget)
+    )
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔔 Подписаться", callback_data=callback_data)]])
+
+# Обработчик нажатия на кнопку подписки
+@instrument_handler('subscribe')
+async def subscribe_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сохраняет поиск пользователя как подписку на новые объявления."""
+    query = update.callback_query
+    await query.answer()
+
+    _, choice, rooms, district, budget = query.data.split(':')
+    params = search_params(
+        CATEGORIES.keys[int(choice)], ROOMS.keys[int(rooms)], DISTRICTS.keys[int(district)], BUDGETS.keys[int(budget)]
+    )
+    await subscriptions.subscribe(
+        update.effective_user.id,
+        params['category'], params['transaction'], params['district'], params['rooms'],
+        BUDGETS.keys[int(budget)]
+    )
+    await query.edit_message_text(
+        "Подписка оформлена! Мы пришлём новые объявления, как только они появятся. "
+        "Отписаться можно командой /unsubscribe."
+    )
+
+# Обработчик команды /unsubscribe
+@instrument_handler('unsubscribe')
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Удаляет все подписки пользователя."""
+    removed = await subscriptions.unsubscribe_all(update.effective_user.id)
+    if removed:
+        await update.message.reply_text("Вы отписались от уведомлений о новых объявлениях.")
+    else:
+        await update.message.reply_text("У вас нет активных подписок.")
+
 # Обработчик ошибок
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Логирует ошибку и отправляет сообщение пользователю."""
@@ -330,54 +598,154 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         )
 
 # Обработчик команды /cancel для выхода из разговора
+@instrument_handler('cancel')
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отменяет текущий разговор."""
     await update.message.reply_text('Разговор отменён. Вы можете начать заново, отправив /start.', reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
+HELP_TEXT = (
+    "Я могу помочь вам с выбором:\n"
+    + "".join(f"- {option.label}\n" for option in CATEGORIES)
+    + "\nПожалуйста, используйте кнопки или команду /start для отображения меню.\n"
+    "Пришлите геопозицию, чтобы увидеть объявления рядом с ней.\n"
+    "Отписаться от уведомлений о новых объявлениях можно командой /unsubscribe."
+)
+
 # Обработчик команды /help
+@instrument_handler('help')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет сообщение с инструкциями по использованию бота."""
-    help_text = (
-        "Я могу помочь вам с выбором:\n"
-        "- Аренда квартиры\n"
-        "- Покупка квартиры\n"
-        "- Аренда дома\n"
-        "- Покупка дома\n\n"
-        "Пожалуйста, используйте кнопки или команду /start для отображения меню."
+    await update.message.reply_text(HELP_TEXT)
+
+# Обработчик присланной геопозиции
+@instrument_handler('nearby')
+async def nearby_listings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает объявления, ближайшие к присланной точке."""
+    location = update.message.location
+    # Район точки не определяется: контуры районов приблизительные, а радиус
+    # поиска и так ограничивает выдачу окрестностью точки
+    with LOOKUP_LATENCY.time(source='geo'):
+        listings = geo_index.within(None, location.latitude, location.longitude, NEARBY_RADIUS, limit=5)
+    if not listings:
+        await update.message.reply_text(f"В радиусе {NEARBY_RADIUS / 1000:g} км от точки объявлений пока нет.")
+        return
+    await update.message.reply_text(
+        f"📍 Объявления в радиусе {NEARBY_RADIUS / 1000:g} км:\n\n" + format_listings(listings),
+        parse_mode='Markdown',
+        disable_web_page_preview=True
     )
-    await update.message.reply_text(help_text)
 
 def budget_min_val(budget_key):
     """Возвращает минимальную цену на основе выбранного бюджета."""
-    budget_min_map = {
-        'budget_under_10k': '0',
-        'budget_10k_20k': '10000',
-        'budget_20k_30k': '20000',
-        'budget_over_30k': '30000'
-    }
-    return budget_min_map.get(budget_key, '0')
+    return budget_range(budget_key).min
 
 def budget_max_val(budget_key):
     """Возвращает максимальную цену на основе выбранного бюджета."""
-    budget_max_map = {
-        'budget_under_10k': '10000',
-        'budget_10k_20k': '20000',
-        'budget_20k_30k': '30000',
-        'budget_over_30k': '1000000'  # Большое число для верхней границы
-    }
-    return budget_max_map.get(budget_key, '1000000')
-
-def main():
-    # Получаем токен из переменных окружения
-    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-
-    if not TOKEN:
-        logger.error("Не удалось найти переменную окружения TELEGRAM_BOT_TOKEN")
-        return
-
-    # Создаём приложение
-    application = ApplicationBuilder().token(TOKEN).build()
+    return budget_range(budget_key).max
+
+async def start_services(application):
+    """Открывает хранилище и запускает фоновые задачи после инициализации бота."""
+    outbox.start(application.bot)
+    await listing_store.open()
+    await subscriptions.open()
+    await leads.open()
+    if crm_sync is not None:
+        await crm_sync.open()
+        crm_sync.schedule(scheduler, interval=int(os.getenv('CRM_SYNC_INTERVAL', '60')))
+    await rebuild_listing_index()
+    prewarmer = ListingPrewarmer(
+        refresh_and_notify,
+        iter_search_space(CATEGORIES, ROOMS, BUDGETS),
+        concurrency=int(os.getenv('PREWARM_CONCURRENCY', '8')),
+        after_run=rebuild_listing_index
+    )
+    # PREWARM_INTERVAL=0 отключает фоновый прогрев
+    prewarm_interval = int(os.getenv('PREWARM_INTERVAL', '600'))
+    if prewarm_interval:
+        prewarmer.schedule(scheduler, interval=prewarm_interval)
+    scheduler.start()
+    await start_metrics(application)
+
+async def start_metrics(application):
+    """Регистрирует показатели очередей и запускает HTTP-сервер метрик."""
+    global metrics_runner
+    REGISTRY.register(Gauge(
+        'bot_listings_cache', 'Статистика кэша результатов поиска', listings_cache.stats, labelname='stat'
+    ))
+    REGISTRY.register(Gauge(
+        'bot_rendered_listings_cache', 'Статистика кэша готовых блоков объявлений', rendered_listings.stats,
+        labelname='stat'
+    ))
+    REGISTRY.register(Gauge(
+        'bot_outbox_pending', 'Сообщения в очереди отправки по полосам приоритета', outbox.pending,
+        labelname='priority'
+    ))
+    REGISTRY.register(Gauge(
+        'bot_leads', 'Заявки в очереди записи и записанные в базу', leads.stats, labelname='stat'
+    ))
+    if lead_notifier.enabled:
+        REGISTRY.register(Gauge(
+            'bot_agent_digests', 'Уведомления агентов о заявках', lead_notifier.stats, labelname='stat'
+        ))
+    if crm_sync is not None:
+        REGISTRY.register(Gauge(
+            'bot_crm_sync', 'Выгрузка заявок в CRM', crm_sync.stats, labelname='stat'
+        ))
+    REGISTRY.register(Gauge(
+        'bot_updates', 'Очереди обработки входящих обновлений', application.dispatch_stats, labelname='stat'
+    ))
+    port = os.getenv('METRICS_PORT', '9100')
+    if port:
+        metrics_runner = await start_metrics_server(os.getenv('METRICS_HOST', '127.0.0.1'), int(port))
+        logger.info("Метрики доступны на порту %s по адресу /metrics", port)
+
+async def stop_services(application):
+    """Досылает накопленные сообщения, пока клиент Bot API ещё открыт."""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await lead_notifier.close()
+    await outbox.stop(timeout=float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '5')))
+
+async def shutdown_services(application):
+    """Закрывает внешние соединения и хранилища."""
+    await leads.close()
+    if crm_sync is not None:
+        await crm_sync.close()
+    await olx_client.close()
+    parser_pool.close()
+    await listing_store.close()
+    await subscriptions.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+def build_application(token, base_url=None):
+    """Создаёт приложение бота со всеми обработчиками.
+
+    ``base_url`` позволяет направить запросы к Bot API на другой сервер,
+    например локальный telegram-bot-api или заглушку из бенчмарков.
+    """
+    # Обновления разных пользователей обрабатываются параллельно,
+    # обновления одного пользователя — строго по порядку
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .application_class(ChatOrderedApplication, kwargs={
+            'max_concurrency': int(os.getenv('UPDATE_CONCURRENCY', '32')),
+            'max_pending': int(os.getenv('UPDATE_QUEUE_LIMIT', '1000'))
+        })
+        .persistence(SQLitePersistence(
+            os.getenv('DB_PATH', 'rieltor.db'),
+            update_interval=float(os.getenv('PERSISTENCE_INTERVAL', '10'))
+        ))
+        .post_init(start_services)
+        .post_stop(stop_services)
+        .post_shutdown(shutdown_services)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
 
     # Определяем ConversationHandler с последовательными шагами
     conv_handler = ConversationHandler(
@@ -394,18 +762,76 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, received_contact)
             ]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='wizard',
+        persistent=True
     )
 
-    # Добавляем обработчики
+    # Добавляем обработчики; кнопка подписки регистрируется раньше мастера,
+    # чтобы её нажатие не было принято за ответ на шаг разговора
+    application.add_handler(CallbackQueryHandler(subscribe_callback, pattern=r'^subscribe:'))
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(MessageHandler(filters.LOCATION, nearby_listings))
 
     # Добавляем обработчик ошибок
     application.add_error_handler(error_handler)
+    return application
+
+def acquire_instance_lock(db_path):
+    """Не даёт запустить второй процесс бота с тем же хранилищем.
 
-    # Запускаем бота
-    application.run_polling()
+    Бот рассчитан на один экземпляр: состояние мастера хранится в локальном
+    SQLite, а прогрев и синхронизация с CRM идут по расписанию внутри
+    процесса. Несколько процессов за балансировщиком делили бы разговоры
+    между собой и одновременно двигали бы отметку синхронизации CRM.
+    Возвращает открытый файл блокировки (его нужно держать до выхода) или
+    None, если хранилище уже занято.
+    """
+    lock_file = open(f'{db_path}.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def main():
+    # Получаем токен из переменных окружения
+    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+
+    if not TOKEN:
+        logger.error("Не удалось найти переменную окружения TELEGRAM_BOT_TOKEN")
+        return
+
+    # Бот работает в одном экземпляре (в том числе в режиме webhook)
+    instance_lock = acquire_instance_lock(os.getenv('DB_PATH', 'rieltor.db'))
+    if instance_lock is None:
+        logger.error("Бот с этим хранилищем (DB_PATH) уже запущен; поддерживается только один экземпляр")
+        return
+
+    application = build_application(TOKEN, base_url=os.getenv('TELEGRAM_API_URL'))
+
+    # Запускаем бота: по умолчанию long polling, BOT_MODE=webhook включает вебхук
+    if os.getenv('BOT_MODE', 'polling') == 'webhook':
+        webhook_url = os.getenv('WEBHOOK_URL')
+        webhook_secret = os.getenv('WEBHOOK_SECRET')
+        if not webhook_url or not webhook_secret:
+            logger.error("Для режима webhook нужны переменные окружения WEBHOOK_URL и WEBHOOK_SECRET")
+            return
+        server = WebhookServer(
+            application,
+            url=webhook_url,
+            secret_token=webhook_secret,
+            path=os.getenv('WEBHOOK_PATH', '/telegram'),
+            host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('PORT', '8080')),
+            queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+        )
+        asyncio.run(run_webhook(application, server))
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
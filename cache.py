@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def make_search_key(category, transaction, rooms, district, budget_min, budget_max):
+    """Приводит параметры поиска к единому ключу кэша."""
+    return (
+        str(category).strip().lower(),
+        str(transaction).strip().lower(),
+        str(rooms).strip().lower(),
+        str(district).strip().lower(),
+        int(budget_min),
+        int(budget_max),
+    )
+
+
+class TTLCache:
+    """Кэш с ограниченным временем жизни записей и вытеснением по LRU.
+
+    Записи старше ``ttl`` секунд считаются отсутствующими, а при превышении
+    ``maxsize`` удаляется запись, к которой дольше всего не обращались.
+    """
+
+    def __init__(self, maxsize=512, ttl=600, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        """Возвращает значение по ключу или ``default``, если его нет или оно устарело."""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._timer():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key, value):
+        """Сохраняет значение и вытесняет самые старые записи сверх лимита."""
+        self._data[key] = (self._timer() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Удаляет все записи и сбрасывает счётчики."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Возвращает счётчики попаданий и промахов."""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+
+from cache import make_search_key
+from geo import DistrictLocator
+from olx import CATEGORY_PATHS
+
+logger = logging.getLogger(__name__)
+
+
+# Разделитель места и даты в строке location-date карточки OLX
+# («Дніпро, Соборний - Сьогодні о 14:05»)
+DATE_SEPARATOR = ' - '
+
+
+def listing_place(location):
+    """Место из строки местоположения карточки без даты публикации или поднятия."""
+    return location.rpartition(DATE_SEPARATOR)[0] or location
+
+
+def listing_hash(listing):
+    """Хэш содержимого карточки: меняется при правке заголовка, цены или адреса.
+
+    Дата в строке местоположения меняется при каждом поднятии объявления и
+    в хэш не входит.
+    """
+    content = '\x1f'.join((listing.title, listing.price, listing_place(listing.location)))
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+class CrawlState:
+    """Что известно об одной комбинации поиска после прошлых обходов.
+
+    ``listings`` — актуальные объявления выдачи (всех районов),
+    ``hashes`` — хэши всех карточек на пройденных страницах.
+    """
+
+    __slots__ = ('etag', 'last_modified', 'listings', 'hashes', 'crawls')
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.listings = {}
+        self.hashes = {}
+        self.crawls = 0
+
+
+class IncrementalCrawler:
+    """Инкрементальный обход результатов OLX.
+
+    Для каждой комбинации поиска запоминаются идентификаторы и хэши уже
+    виденных объявлений и валидаторы первой страницы (ETag/Last-Modified).
+    Результаты отсортированы по дате, поэтому обход останавливается на первой
+    странице, где встретилось уже известное неизменённое объявление, а ответ
+    304 на первую страницу означает, что менять нечего. Каждый
+    ``full_every``-й обход проходит все ``max_pages`` страниц, чтобы убрать
+    снятые с публикации объявления.
+
+    Состояние хранится в памяти: после перезапуска первый обход будет полным.
+    Район объявления определяет ``locator`` (geo.DistrictLocator); без него
+    район проверяется только по строке местоположения (geo.district_from_text).
+    """
+
+    def __init__(self, client, max_pages=5, full_every=6, locator=None):
+        self.client = client
+        self.max_pages = max_pages
+        self.full_every = full_every
+        self.matches_district = (locator if locator is not None else DistrictLocator([])).matches
+        self._states = {}
+        self._running = {}
+
+    async def crawl_all(self, category, transaction, rooms, budget_min, budget_max):
+        """Обновляет выдачу OLX и возвращает ``(объявления, новые)``.
+
+        Район в запрос к OLX не входит, поэтому выдача обходится целиком, а
+        объявления района отбирает ``matches_district``. Возвращаются
+        актуальный список объявлений выдачи и те из них, что появились или
+        изменились с прошлого обхода; на первом обходе новых нет.
+        Одновременные вызовы с одинаковыми параметрами ждут один общий обход,
+        и новые объявления получает только начавший его вызов, чтобы они
+        не были разосланы подписчикам дважды.
+        """
+        key = make_search_key(category, transaction, rooms, None, budget_min, budget_max)
+        task = self._running.get(key)
+        if task is not None:
+            listings, _ = await asyncio.shield(task)
+            return listings, []
+        task = asyncio.ensure_future(self._crawl(key, category, transaction, rooms, budget_min, budget_max))
+        self._running[key] = task
+        task.add_done_callback(lambda _: self._running.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _crawl(self, key, category, transaction, rooms, budget_min, budget_max):
+        state = self._states.setdefault(key, CrawlState())
+        full = state.crawls % self.full_every == 0
+        path = CATEGORY_PATHS[(category, transaction)]
+
+        fetched = {}
+        seen = {}
+        pages = 0
+        # Валидаторы первой страницы сохраняются только после успешного обхода:
+        # иначе после сбоя на следующей странице повторный обход получил бы 304
+        # и потерял бы объявления, которые не успел дочитать
+        etag, last_modified = state.etag, state.last_modified
+        for page in range(1, self.max_pages + 1):
+            params = self.client.build_params(rooms, budget_min, budget_max, page)
+            if page == 1 and not full:
+                content, page_etag, page_last_modified = await self.client.fetch_page_if_modified(
+                    path, params, state.etag, state.last_modified
+                )
+            else:
+                content, page_etag, page_last_modified = await self.client.fetch_page_if_modified(path, params)
+            pages += 1
+            if content is None:
+                break
+            if page == 1:
+                etag, last_modified = page_etag, page_last_modified
+
+            cards = await self.client.parse(content)
+            reached_known = False
+            for listing in cards:
+                content_hash = listing_hash(listing)
+                if state.hashes.get(listing.id) == content_hash:
+                    reached_known = True
+                seen[listing.id] = content_hash
+                fetched[listing.id] = listing
+            if not cards or (reached_known and not full):
+                break
+
+        new = [
+            listing for listing_id, listing in fetched.items()
+            if state.crawls and state.hashes.get(listing_id) != seen[listing_id]
+        ]
+        if full:
+            state.hashes = seen
+        else:
+            # Свежие страницы идут первыми, за ними — ранее известные объявления
+            fetched.update((i, l) for i, l in state.listings.items() if i not in fetched)
+            state.hashes.update(seen)
+        state.listings = fetched
+        state.etag, state.last_modified = etag, last_modified
+        state.crawls += 1
+
+        logger.debug("Обход %s: страниц %d, новых объявлений %d", key, pages, len(new))
+        return list(state.listings.values()), new
@@ -0,0 +1,279 @@
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crm_checkpoints (
+    sink TEXT PRIMARY KEY,
+    last_lead_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crm_rejected (
+    sink TEXT NOT NULL,
+    first_lead_id INTEGER NOT NULL,
+    last_lead_id INTEGER NOT NULL,
+    error TEXT NOT NULL,
+    rejected_at REAL NOT NULL,
+    PRIMARY KEY (sink, first_lead_id)
+);
+"""
+
+SELECT_LEADS = """
+SELECT id, uid, user_id, chat_id, category, rooms, district, renovation, budget, payment, contact, created_at
+FROM leads
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+LEAD_FIELDS = (
+    'id', 'uid', 'user_id', 'chat_id', 'category', 'rooms', 'district',
+    'renovation', 'budget', 'payment', 'contact', 'created_at',
+)
+
+
+class CrmSyncError(Exception):
+    """Пачку заявок не удалось выгрузить в CRM."""
+
+
+class CrmRejectedError(CrmSyncError):
+    """CRM отклонила пачку заявок, и повтор не поможет."""
+
+
+def _lead_record(row):
+    record = dict(zip(LEAD_FIELDS, row))
+    record['created_at'] = datetime.fromtimestamp(record['created_at'], timezone.utc).isoformat()
+    return record
+
+
+def batch_key(leads):
+    """Ключ идемпотентности пачки: одинаков для одних и тех же заявок."""
+    digest = hashlib.blake2b(digest_size=16)
+    for lead in leads:
+        digest.update(lead['uid'].encode())
+    return digest.hexdigest()
+
+
+def write_jsonl(f, leads):
+    """Записывает заявки в файл по одному JSON-объекту на строку."""
+    f.writelines(json.dumps(lead, ensure_ascii=False) + '\n' for lead in leads)
+
+
+def write_csv(f, leads):
+    """Записывает заявки в CSV с заголовком."""
+    writer = csv.DictWriter(f, fieldnames=LEAD_FIELDS)
+    writer.writeheader()
+    writer.writerows(leads)
+
+
+# Форматы файловой выгрузки: расширение файла → функция записи
+FILE_WRITERS = {
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+}
+
+
+class FileSink:
+    """Выгружает каждую пачку в отдельный файл каталога ``directory``.
+
+    Содержимое файла пишет ``write(f, leads)``, а ``extension`` задаёт
+    расширение. Имя файла определяется номером первой заявки пачки, то есть
+    контрольной точкой, с которой она выгружалась, а файл записывается через
+    временный и переименовывается. Поэтому повторная выгрузка с той же точки
+    просто заменяет файл, даже если в пачку успели попасть новые заявки.
+    """
+
+    def __init__(self, directory, extension, write):
+        self.directory = directory
+        self.extension = extension
+        self.write = write
+        self.name = f'{extension}:{os.path.abspath(directory)}'
+
+    def _export(self, leads):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"leads-{leads[0]['id']:010d}.{self.extension}"
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            self.write(f, leads)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    async def send(self, leads):
+        await asyncio.to_thread(self._export, leads)
+
+    async def close(self):
+        pass
+
+
+class HttpSink:
+    """Отправляет пачку заявок одним POST-запросом ``{"leads": [...]}``.
+
+    У каждого запроса есть заголовок Idempotency-Key, а у каждой заявки — uid,
+    поэтому CRM может безопасно отбросить повторно присланные данные.
+    Сетевые ошибки, 429 и 5xx повторяются с экспоненциальной задержкой,
+    остальные ответы 4xx означают, что пачку нужно разбирать вручную.
+    """
+
+    def __init__(self, url, token=None, timeout=30, max_retries=5, max_backoff=60):
+        self.url = url
+        self.name = url
+        self.token = token
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._session = None
+
+    async def send(self, leads):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        headers = {'Idempotency-Key': batch_key(leads)}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = {'leads': leads}
+
+        for attempt in range(1, self.max_retries + 1):
+            delay = min(2 ** attempt, self.max_backoff)
+            try:
+                async with self._session.post(self.url, json=payload, headers=headers) as response:
+                    if response.status < 300:
+                        return
+                    text = await response.text()
+                    if response.status != 429 and response.status < 500:
+                        raise CrmRejectedError(f"CRM ответила {response.status}: {text[:200]}")
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = min(int(retry_after), self.max_backoff)
+                    logger.warning("CRM ответила %s, повтор через %s с", response.status, delay)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                logger.warning("Ошибка связи с CRM (%s), повтор через %s с", exc, delay)
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        raise CrmSyncError(f"Пачка не отправлена за {self.max_retries} попыток")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def make_sink(spec, token=None):
+    """Создаёт приёмник по строке настройки: ``jsonl:каталог``, ``csv:каталог`` или URL."""
+    if spec.startswith(('http://', 'https://')):
+        return HttpSink(spec, token=token)
+    kind, _, directory = spec.partition(':')
+    if kind in FILE_WRITERS and directory:
+        return FileSink(directory, kind, FILE_WRITERS[kind])
+    raise ValueError(f"Неизвестный приёмник CRM: {spec}")
+
+
+class CrmSync:
+    """Фоновая выгрузка новых заявок в CRM пачками.
+
+    Заявки читаются из таблицы leads по возрастанию id пачками по
+    ``batch_size``. После успешной отправки пачки номер последней заявки
+    сохраняется как контрольная точка приёмника, так что после сбоя или
+    перезапуска выгрузка продолжается с неё. Пачка, отправка которой не
+    подтвердилась, будет отправлена повторно; приёмники идемпотентны, и
+    дубликатов не появится. Пачка, которую CRM отклонила окончательно
+    (CrmRejectedError), не задерживает следующие: диапазон её заявок
+    записывается в таблицу crm_rejected для ручного разбора, и выгрузка идёт
+    дальше. Обработчики бота с выгрузкой никак не связаны.
+    """
+
+    def __init__(self, path, sink, batch_size=500):
+        self.path = path
+        self.sink = sink
+        self.batch_size = batch_size
+        self.checkpoint = 0
+        self.synced = 0
+        self.failures = 0
+        self.rejected = 0
+        self._db = None
+
+    async def open(self):
+        """Открывает базу и загружает контрольную точку приёмника."""
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute('PRAGMA journal_mode=WAL')
+        await self._db.executescript(SCHEMA)
+        await self._db.commit()
+        async with self._db.execute(
+            'SELECT last_lead_id FROM crm_checkpoints WHERE sink = ?', (self.sink.name,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        self.checkpoint = row[0] if row else 0
+
+    async def close(self):
+        await self.sink.close()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self):
+        return {
+            'checkpoint': self.checkpoint, 'synced': self.synced,
+            'failures': self.failures, 'rejected': self.rejected,
+        }
+
+    async def run(self):
+        """Выгружает все заявки после контрольной точки; возвращает их число."""
+        synced = 0
+        while True:
+            async with self._db.execute(SELECT_LEADS, (self.checkpoint, self.batch_size)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                break
+            leads = [_lead_record(row) for row in rows]
+            try:
+                await self.sink.send(leads)
+            except CrmRejectedError as exc:
+                self.rejected += len(leads)
+                logger.error(
+                    "CRM отклонила заявки %d–%d, пачка отложена в crm_rejected: %s",
+                    leads[0]['id'], leads[-1]['id'], exc
+                )
+                await self._db.execute(
+                    'INSERT OR REPLACE INTO crm_rejected '
+                    '(sink, first_lead_id, last_lead_id, error, rejected_at) VALUES (?, ?, ?, ?, ?)',
+                    (self.sink.name, leads[0]['id'], leads[-1]['id'], str(exc), time.time())
+                )
+            except Exception:
+                self.failures += 1
+                logger.exception("Не удалось выгрузить заявки %d–%d в CRM", leads[0]['id'], leads[-1]['id'])
+                break
+            else:
+                synced += len(leads)
+            await self._db.execute(
+                'INSERT OR REPLACE INTO crm_checkpoints (sink, last_lead_id) VALUES (?, ?)',
+                (self.sink.name, leads[-1]['id'])
+            )
+            await self._db.commit()
+            self.checkpoint = leads[-1]['id']
+            if len(rows) < self.batch_size:
+                break
+        if synced:
+            self.synced += synced
+            logger.info("Выгружено заявок в CRM: %d", synced)
+        return synced
+
+    def schedule(self, scheduler, interval):
+        """Регистрирует периодическую выгрузку."""
+        return scheduler.add_job(
+            self.run,
+            'interval',
+            seconds=interval,
+            max_instances=1,
+            coalesce=True,
+            id='crm_sync',
+            replace_existing=True,
+        )
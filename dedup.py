@@ -0,0 +1,159 @@
+import re
+import zlib
+
+import numpy as np
+
+# Параметры MinHash: 64 перестановки, разбитые на 16 полос по 4 значения.
+# Пара с похожестью по Жаккару 0.7 попадает в общую корзину хотя бы одной
+# полосы с вероятностью ~99 %, а пара с похожестью 0.3 — лишь в ~12 % случаев
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+# Со сколькими соседями по корзине сравнивается каждое объявление
+BUCKET_WINDOW = 8
+
+# Сколько пар-кандидатов проверяется за раз (ограничивает временную память)
+VERIFY_CHUNK = 1 << 18
+
+# Оценка похожести и допустимое расхождение цен, при которых объявления считаются копиями
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_PRICE_TOLERANCE = 0.05
+
+# Перестановки — x -> a * x + b по модулю 2**32 с нечётным a (переполнение
+# uint32 и есть взятие по модулю); параметры фиксированы, чтобы подписи из
+# хранилища оставались сравнимыми после перезапуска
+_rng = np.random.default_rng(20240601)
+_A = (_rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64) | 1).astype(np.uint32)[:, None]
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)[:, None]
+_SHINGLE_POWERS = np.uint64(1000003) ** np.arange(SHINGLE_SIZE, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, ROWS, dtype=np.uint64)
+
+_TAGS = re.compile(r'<[^>]+>')
+_NON_WORD = re.compile(r'\W+')
+
+
+def normalize(text):
+    """Приводит текст к виду для сравнения: без разметки, регистра и пунктуации."""
+    return _NON_WORD.sub(' ', _TAGS.sub(' ', text).lower()).strip()
+
+
+def shingle_hashes(title, description='', price=None):
+    """32-битные хэши символьных шинглов заголовка и описания плюс токен цены."""
+    text = normalize(f'{title} {description}')
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) >= SHINGLE_SIZE:
+        # Полиномиальный хэш каждого окна по SHINGLE_SIZE символов (с переполнением uint64)
+        windows = np.lib.stride_tricks.sliding_window_view(codes, SHINGLE_SIZE)
+        hashes = windows @ _SHINGLE_POWERS
+        hashes = (hashes ^ (hashes >> np.uint64(32))).astype(np.uint32)
+    else:
+        hashes = np.array([zlib.crc32(text.encode())], dtype=np.uint32)
+    if price is not None:
+        hashes = np.append(hashes, np.uint32(zlib.crc32(f'price:{price}'.encode())))
+    return hashes
+
+
+def minhash_signature(title, description='', price=None):
+    """MinHash-подпись объявления: NUM_PERM значений uint32 в виде байтов."""
+    return (_A * shingle_hashes(title, description, price) + _B).min(axis=1).tobytes()
+
+
+def _band_pairs(signatures):
+    """Пары строк, совпавших хотя бы в одной полосе.
+
+    Строки каждой полосы сортируются по ключу корзины, и каждая строка
+    сравнивается с ``BUCKET_WINDOW`` следующими за ней: небольшие корзины
+    проверяются целиком, а число пар в крупных растёт линейно, а не
+    квадратично.
+    """
+    left, right = [], []
+    for band in range(BANDS):
+        keys = signatures[:, band * ROWS:(band + 1) * ROWS].astype(np.uint64) @ _BAND_MIX
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        for offset in range(1, min(BUCKET_WINDOW, len(keys) - 1) + 1):
+            same = np.flatnonzero(keys[offset:] == keys[:-offset])
+            if not len(same):
+                break
+            left.append(order[same])
+            right.append(order[same + offset])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def _components(size, u, v):
+    """Компоненты связности графа: для каждой вершины — наименьший номер в её компоненте."""
+    label = np.arange(size)
+    while True:
+        low = np.minimum(label[u], label[v])
+        new = label.copy()
+        np.minimum.at(new, u, low)
+        np.minimum.at(new, v, low)
+        np.minimum.at(new, label[u], low)
+        np.minimum.at(new, label[v], low)
+        new = new[new]
+        if np.array_equal(new, label):
+            return label
+        label = new
+
+
+def near_duplicate_clusters(signatures, prices=None, threshold=DEFAULT_THRESHOLD,
+                            price_tolerance=DEFAULT_PRICE_TOLERANCE):
+    """Группирует почти одинаковые объявления.
+
+    ``signatures`` — подписи minhash_signature (None для объявлений без
+    подписи), ``prices`` — цены числом (None или отрицательное значение —
+    цена неизвестна). Кандидаты в копии ищутся по корзинам LSH, а затем
+    проверяются оценкой похожести по подписям и расхождением цен, так что
+    время растёт почти линейно с числом объявлений. Возвращает массив
+    номеров групп: у копий он общий, а у объявления без копий — собственный.
+    """
+    labels = np.arange(len(signatures))
+    rows = np.array([index for index, signature in enumerate(signatures) if signature], dtype=np.int64)
+    if len(rows) < 2:
+        return labels
+    matrix = np.frombuffer(b''.join(signatures[index] for index in rows), dtype=np.uint32).reshape(-1, NUM_PERM)
+    u, v = _band_pairs(matrix)
+    if len(u):
+        # Одна и та же пара могла совпасть в нескольких полосах
+        pairs = np.unique(np.minimum(u, v) * len(rows) + np.maximum(u, v))
+        u, v = np.divmod(pairs, len(rows))
+        min_equal = threshold * NUM_PERM
+        similar = np.concatenate([
+            np.count_nonzero(matrix[u[start:start + VERIFY_CHUNK]] == matrix[v[start:start + VERIFY_CHUNK]], axis=1)
+            >= min_equal
+            for start in range(0, len(u), VERIFY_CHUNK)
+        ])
+        if prices is not None:
+            price = np.array([-1 if value is None else value for value in prices], dtype=np.int64)[rows]
+            pu, pv = price[u], price[v]
+            known = (pu > 0) & (pv > 0)
+            similar &= ~known | (np.abs(pu - pv) <= price_tolerance * np.maximum(pu, pv))
+        u, v = u[similar], v[similar]
+    labels[rows] = rows[_components(len(rows), u, v)]
+    return labels
+
+
+def dedupe(listings, **kwargs):
+    """Оставляет по одному объявлению из каждой группы копий, сохраняя порядок.
+
+    Если хотя бы у одного объявления подписи нет (она отбрасывается после
+    записи в хранилище), подписи всех объявлений считаются заново по
+    заголовку и цене, чтобы сравнивались подписи одного вида.
+    """
+    if len(listings) < 2:
+        return list(listings)
+    signatures = [listing.signature for listing in listings]
+    if not all(signatures):
+        signatures = [minhash_signature(listing.title, price=listing.price_value) for listing in listings]
+    clusters = near_duplicate_clusters(signatures, [listing.price_value for listing in listings], **kwargs)
+    seen = set()
+    unique = []
+    for listing, cluster in zip(listings, clusters.tolist()):
+        if cluster not in seen:
+            seen.add(cluster)
+            unique.append(listing)
+    return unique
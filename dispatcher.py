@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from collections import deque
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedApplication(Application):
+    """Application с параллельной обработкой обновлений разных пользователей.
+
+    Каждое обновление попадает в очередь своего чата и пользователя — ту же
+    пару, по которой ConversationHandler хранит состояние. Очереди
+    обрабатываются параллельно, не более ``max_concurrency`` обновлений
+    одновременно, а внутри одной очереди строго по порядку. Так медленный
+    ответ одному пользователю не задерживает остальных, и шаги мастера не
+    перемешиваются. Если ожидают обработки ``max_pending`` обновлений, приём
+    новых приостанавливается.
+    """
+
+    def __init__(self, *, max_concurrency=32, max_pending=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._lanes = {}
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pending_count = 0
+        self._processing = 0
+        self._peak_pending = 0
+
+    @staticmethod
+    def lane_key(update):
+        """Ключ очереди обновления: (id чата, id пользователя)."""
+        if isinstance(update, Update):
+            chat, user = update.effective_chat, update.effective_user
+            return (chat.id if chat else None, user.id if user else None)
+        return None
+
+    def dispatch_stats(self):
+        """Глубина очередей обработки обновлений."""
+        return {
+            'pending': self._pending_count,
+            'processing': self._processing,
+            'lanes': len(self._lanes),
+            'peak_pending': self._peak_pending,
+        }
+
+    async def process_update(self, update):
+        """Ставит обновление в очередь его чата и сразу возвращает управление."""
+        if not self.running:
+            # Во время остановки дообрабатываем оставшиеся обновления по одному,
+            # дождавшись очередей, чтобы не нарушить порядок
+            await self._idle.wait()
+            await super().process_update(update)
+            return
+
+        async with self._space:
+            await self._space.wait_for(lambda: self._pending_count < self.max_pending)
+            self._pending_count += 1
+            self._peak_pending = max(self._peak_pending, self._pending_count)
+
+        key = self.lane_key(update)
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(update)
+            return
+        self._lanes[key] = deque([update])
+        self._idle.clear()
+        self.create_task(self._run_lane(key))
+
+    async def _run_lane(self, key):
+        lane = self._lanes[key]
+        try:
+            while lane:
+                async with self._slots:
+                    self._processing += 1
+                    try:
+                        await super().process_update(lane[0])
+                    except Exception:
+                        logger.exception("Ошибка при обработке обновления")
+                    finally:
+                        self._processing -= 1
+                lane.popleft()
+                async with self._space:
+                    self._pending_count -= 1
+                    self._space.notify()
+        finally:
+            # Очередь удаляется, только когда в ней не осталось обновлений
+            del self._lanes[key]
+            if not self._lanes:
+                self._idle.set()
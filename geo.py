@@ -0,0 +1,217 @@
+import json
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from listing import ListingBatch
+from options import DISTRICTS
+
+# OLX не даёт стабильных идентификаторов районов в URL, поэтому район
+# проверяется по строке местоположения в карточке (русское и украинское написание)
+DISTRICT_KEYWORDS = {
+    'central_district': ('Центральн',),
+    'dnepropetrovsk_district': ('Днепропетровск', 'Дніпропетровськ'),
+    'zhovtnevyi_district': ('Жовтнев', 'Октябрьск'),
+    'sobornyi_district': ('Соборн',),
+    'lomonosovskyi_district': ('Ломоносовск', 'Ломоносівськ'),
+    'partyzanskyi_district': ('Партизанск', 'Партизанськ'),
+}
+
+# Локальная равнопромежуточная проекция вокруг центра города: на масштабах
+# Днепра её искажение меньше метра на километр
+ORIGIN_LAT, ORIGIN_LON = 48.465, 35.045
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LON = 111320.0 * math.cos(math.radians(ORIGIN_LAT))
+
+# Смещение номеров ячеек, чтобы они были неотрицательными в ключе индекса
+CELL_OFFSET = 1 << 20
+
+
+def project(lat, lon):
+    """Переводит широту и долготу в метры от центра города (работает и с массивами NumPy)."""
+    return (lon - ORIGIN_LON) * METERS_PER_DEGREE_LON, (lat - ORIGIN_LAT) * METERS_PER_DEGREE_LAT
+
+
+def load_districts(path):
+    """Читает контуры районов из GeoJSON: список ``(район, [внешнее кольцо, дыры...])``.
+
+    В свойстве district каждого контура — ключ района мастера.
+
+    Кольца — списки точек ``(долгота, широта)``, как в GeoJSON.
+    MultiPolygon раскладывается на отдельные многоугольники того же района.
+    """
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    polygons = []
+    for feature in collection['features']:
+        district = feature['properties']['district']
+        if district not in DISTRICTS:
+            raise ValueError(f"Неизвестный район в контурах: {district}")
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            parts = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            parts = geometry['coordinates']
+        else:
+            raise ValueError(f"Неподдерживаемый тип контура: {geometry['type']}")
+        for rings in parts:
+            polygons.append((district, [[tuple(point) for point in ring] for ring in rings]))
+    return polygons
+
+
+def _in_ring(lon, lat, ring):
+    """Проверка попадания точки в кольцо лучом (чётность пересечений)."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _in_polygon(lon, lat, rings):
+    outer, *holes = rings
+    return _in_ring(lon, lat, outer) and not any(_in_ring(lon, lat, hole) for hole in holes)
+
+
+def district_from_text(location):
+    """Определяет район по строке местоположения карточки OLX."""
+    for district, keywords in DISTRICT_KEYWORDS.items():
+        if any(keyword in location for keyword in keywords):
+            return district
+    return None
+
+
+class DistrictLocator:
+    """Определение района по координатам через равномерную сетку.
+
+    Охватывающий прямоугольник всех контуров делится на ячейки по ``cell``
+    градусов, и каждой ячейке заранее сопоставляются многоугольники, чьи
+    габариты её задевают. Запрос проверяет попадание только в эти один-два
+    многоугольника, поэтому не зависит от числа и сложности контуров.
+    Без контуров (пустой список) район определяется только по тексту.
+    """
+
+    def __init__(self, polygons, cell=0.005):
+        self.polygons = polygons
+        self.cell = cell
+        self._cells = defaultdict(list)
+        if not polygons:
+            self.min_lon = self.min_lat = 0.0
+            return
+        points = [point for _, rings in polygons for point in rings[0]]
+        self.min_lon = min(lon for lon, _ in points)
+        self.min_lat = min(lat for _, lat in points)
+        for number, (_, rings) in enumerate(polygons):
+            lons = [lon for lon, _ in rings[0]]
+            lats = [lat for _, lat in rings[0]]
+            low_x, low_y = self._cell_of(min(lats), min(lons))
+            high_x, high_y = self._cell_of(max(lats), max(lons))
+            for cx in range(low_x, high_x + 1):
+                for cy in range(low_y, high_y + 1):
+                    self._cells[cx, cy].append(number)
+
+    def _cell_of(self, lat, lon):
+        return int((lon - self.min_lon) // self.cell), int((lat - self.min_lat) // self.cell)
+
+    def locate(self, lat, lon):
+        """Возвращает ключ района, в который попадает точка, или None."""
+        for number in self._cells.get(self._cell_of(lat, lon), ()):
+            district, rings = self.polygons[number]
+            if _in_polygon(lon, lat, rings):
+                return district
+        return None
+
+    def resolve(self, listing):
+        """Район объявления: по строке местоположения OLX, а если в ней района нет — по точке на карте."""
+        district = district_from_text(listing.location)
+        if district is None and listing.lat is not None and listing.lon is not None:
+            district = self.locate(listing.lat, listing.lon)
+        return district
+
+    def matches(self, listing, district):
+        """Проверяет, относится ли объявление к выбранному району."""
+        if district not in DISTRICTS:
+            return True
+        return self.resolve(listing) == district
+
+
+class GeoIndex:
+    """Сеточный индекс объявлений с координатами.
+
+    Точки переводятся в метры и раскладываются по квадратным ячейкам со
+    стороной ``cell`` метров отдельно для каждого района. Строки пакета
+    упорядочены по ключу (район, ячейка), так что содержимое ячейки — это
+    непрерывный отрезок массивов. Запрос «в районе X в радиусе R» смотрит
+    только ячейки, задевающие круг, и точно отсекает лишние точки по
+    расстоянию. Район объявления — тот, что определил DistrictLocator при
+    обходе OLX и записал в хранилище. Из группы копий в ответ попадает
+    ближайшее объявление.
+    """
+
+    def __init__(self, batch, cell=500):
+        if not isinstance(batch, ListingBatch):
+            batch = ListingBatch(batch)
+        self.batch = batch
+        self.cell = cell
+        lat = np.frombuffer(batch.lats, dtype=np.float64)
+        lon = np.frombuffer(batch.lons, dtype=np.float64)
+        codes = {key: code for code, key in enumerate(DISTRICTS.keys)}
+        district = np.fromiter(
+            (codes.get(value, -1) for value in batch.districts), dtype=np.int64, count=len(batch)
+        )
+        rows = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon) & (district >= 0))
+        x, y = project(lat[rows], lon[rows])
+        key = self._key(district[rows], np.floor(x / cell).astype(np.int64), np.floor(y / cell).astype(np.int64))
+        order = np.argsort(key, kind='stable')
+        self.rows = rows[order]
+        self.clusters = np.frombuffer(batch.clusters, dtype=np.int64)[self.rows]
+        self.x = x[order]
+        self.y = y[order]
+        keys, starts = np.unique(key[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self._cells = dict(zip(keys.tolist(), zip(starts.tolist(), ends.tolist())))
+        self._codes = codes
+
+    @staticmethod
+    def _key(district, cx, cy):
+        return (district * (2 * CELL_OFFSET) + cx + CELL_OFFSET) * (2 * CELL_OFFSET) + cy + CELL_OFFSET
+
+    def __len__(self):
+        return len(self.rows)
+
+    def within(self, district, lat, lon, radius, limit=None):
+        """Объявления района в радиусе ``radius`` метров от точки, ближайшие первыми.
+
+        При ``district=None`` ищутся объявления всех районов.
+        """
+        if district is None:
+            codes = list(self._codes.values())
+        elif district in self._codes:
+            codes = [self._codes[district]]
+        else:
+            return []
+        px, py = project(lat, lon)
+        low_x, high_x = math.floor((px - radius) / self.cell), math.floor((px + radius) / self.cell)
+        low_y, high_y = math.floor((py - radius) / self.cell), math.floor((py + radius) / self.cell)
+        spans = [
+            self._cells[key]
+            for code in codes
+            for cx in range(low_x, high_x + 1)
+            for cy in range(low_y, high_y + 1)
+            if (key := self._key(code, cx, cy)) in self._cells
+        ]
+        if not spans:
+            return []
+        candidates = np.concatenate([np.arange(start, end) for start, end in spans])
+        distance = np.hypot(self.x[candidates] - px, self.y[candidates] - py)
+        inside = distance <= radius
+        candidates, distance = candidates[inside], distance[inside]
+        order = np.argsort(distance, kind='stable')
+        _, first = np.unique(self.clusters[candidates[order]], return_index=True)
+        order = order[np.sort(first)]
+        if limit is not None:
+            order = order[:limit]
+        return self.batch.take(self.rows[candidates[order]])
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    category TEXT,
+    rooms TEXT,
+    district TEXT,
+    renovation TEXT,
+    budget TEXT,
+    payment TEXT,
+    contact TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+INSERT_LEAD = """
+INSERT OR IGNORE INTO leads (
+    uid, user_id, chat_id, category, rooms, district, renovation, budget, payment, contact, created_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+@dataclass(slots=True)
+class Lead:
+    """Заявка, собранная мастером.
+
+    ``uid`` присваивается при создании и делает запись идемпотентной:
+    повторная вставка той же заявки после сбоя ничего не меняет.
+    """
+
+    user_id: int
+    chat_id: int
+    category: Optional[str]
+    rooms: Optional[str]
+    district: Optional[str]
+    renovation: Optional[str]
+    budget: Optional[str]
+    payment: Optional[str]
+    contact: str
+    created_at: float = field(default_factory=time.time)
+    uid: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def row(self):
+        return (
+            self.uid, self.user_id, self.chat_id, self.category, self.rooms, self.district,
+            self.renovation, self.budget, self.payment, self.contact, self.created_at,
+        )
+
+
+class LeadPipeline:
+    """Очередь записи заявок в SQLite.
+
+    Обработчик только кладёт заявку в очередь и сразу отвечает пользователю.
+    Фоновая задача забирает из очереди всё накопившееся (до ``batch_size``
+    заявок, подождав до ``linger`` секунд после первой) и записывает пачку
+    одной транзакцией. В режиме WAL с ``synchronous=FULL`` каждая фиксация —
+    это один fsync журнала, так что при всплеске заявок fsync делится на всю
+    пачку, а заявка считается сохранённой только после фиксации. При ошибке
+    записи пачка повторяется, пока не будет записана.
+    """
+
+    def __init__(self, path, batch_size=100, linger=0.05, queue_size=10000, retry_delay=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_delay = retry_delay
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._db = None
+        self._writer = None
+        self.written = 0
+        self.batches = 0
+
+    async def open(self):
+        """Открывает базу и запускает фоновую запись."""
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute('PRAGMA journal_mode=WAL')
+        await self._db.execute('PRAGMA synchronous=FULL')
+        await self._db.executescript(SCHEMA)
+        await self._db.commit()
+        self._writer = asyncio.create_task(self._run())
+
+    async def close(self, timeout=10):
+        """Дописывает заявки из очереди (не дольше ``timeout`` секунд) и закрывает базу."""
+        if self._writer is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.error("Не записаны заявки при остановке: %d", self._queue.qsize())
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def submit(self, lead):
+        """Ставит заявку в очередь записи; ждёт, только если очередь переполнена."""
+        await self._queue.put(lead)
+
+    def stats(self):
+        """Заявки в очереди и записанные с момента запуска."""
+        return {'pending': self._queue.qsize(), 'written': self.written, 'batches': self.batches}
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            if self._queue.empty():
+                # Даём подтянуться заявкам из того же всплеска
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            rows = [lead.row() for lead in batch]
+            while True:
+                try:
+                    await self._db.executemany(INSERT_LEAD, rows)
+                    await self._db.commit()
+                    break
+                except Exception:
+                    logger.exception("Не удалось записать %d заявок, повторяем", len(rows))
+                    await self._db.rollback()
+                    await asyncio.sleep(self.retry_delay)
+            self.written += len(batch)
+            self.batches += 1
+            for _ in batch:
+                self._queue.task_done()
+            logger.debug("Записано заявок: %d", len(batch))
@@ -0,0 +1,210 @@
+import itertools
+import math
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+
+# Значение отсутствующей цены в колонке price_values пакета
+MISSING_PRICE = -1
+
+
+def _intern(value):
+    return None if value is None else sys.intern(value)
+
+
+def _float_or_nan(value):
+    return math.nan if value is None else value
+
+
+def _nan_to_none(value):
+    return None if math.isnan(value) else value
+
+
+@dataclass(slots=True)
+class Listing:
+    """Объявление OLX.
+
+    ``price`` — цена так, как она показана на сайте, ``price_value`` — она же
+    числом. Параметры поиска (категория, сделка, комнаты, район) известны
+    только для объявлений из хранилища; их строки интернируются, поэтому
+    сотни тысяч объявлений ссылаются на одни и те же несколько объектов.
+    ``lat`` и ``lon`` — координаты с карты объявления, если OLX их отдал,
+    ``signature`` — MinHash-подпись для поиска копий (см. dedup.py). Подпись
+    считается при разборе страницы и нужна только до записи в хранилище,
+    после чего отбрасывается (release_signatures): дальше копии ищутся по
+    группам из хранилища.
+    """
+
+    id: str
+    title: str
+    price: str
+    link: str
+    location: str = ''
+    price_value: Optional[int] = None
+    category: Optional[str] = None
+    transaction: Optional[str] = None
+    rooms: Optional[str] = None
+    district: Optional[str] = None
+    first_seen: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    signature: Optional[bytes] = None
+
+    def __post_init__(self):
+        self.category = _intern(self.category)
+        self.transaction = _intern(self.transaction)
+        self.rooms = _intern(self.rooms)
+        self.district = _intern(self.district)
+
+
+def release_signatures(listings):
+    """Отбрасывает подписи MinHash записанных объявлений, чтобы не держать их в кэшах."""
+    for listing in listings:
+        listing.signature = None
+
+
+class StringColumn:
+    """Колонка строк, упакованных подряд в один буфер UTF-8.
+
+    Вместо объекта str на каждое значение (с заголовком в 50–70 байт и
+    указателем в списке) хранятся только байты строки и её смещение.
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, values=()):
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        self.data += value.encode()
+        self.offsets.append(len(self.data))
+
+    def _raw(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self._raw(index).decode()
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def reorder(self, order):
+        """Возвращает колонку со значениями в порядке ``order``."""
+        data, offsets = self.data, self.offsets
+        pieces = [data[offsets[index]:offsets[index + 1]] for index in order]
+        column = StringColumn()
+        column.data = bytearray().join(pieces)
+        column.offsets.extend(itertools.accumulate(map(len, pieces)))
+        return column
+
+
+class ListingBatch:
+    """Колоночное представление множества объявлений.
+
+    Каждое поле хранится отдельной колонкой: текстовые поля — в StringColumn,
+    цена, время первого появления и координаты — массивами ``array``, параметры поиска —
+    списками ссылок на интернированные строки. Объекты Listing создаются
+    только для запрошенных строк (``take``), поэтому пакет подходит для
+    хранения всего корпуса в памяти. Подписи MinHash в пакете не хранятся:
+    вместо них колонка ``clusters`` с номером группы копий объявления.
+    """
+
+    __slots__ = (
+        'ids', 'titles', 'prices', 'links', 'locations', 'price_values',
+        'categories', 'transactions', 'rooms', 'districts', 'first_seen', 'lats', 'lons', 'clusters',
+    )
+
+    def __init__(self, listings=()):
+        self.ids = StringColumn()
+        self.titles = StringColumn()
+        self.prices = StringColumn()
+        self.links = StringColumn()
+        self.locations = StringColumn()
+        self.price_values = array('q')
+        self.categories = []
+        self.transactions = []
+        self.rooms = []
+        self.districts = []
+        self.first_seen = array('d')
+        self.lats = array('d')
+        self.lons = array('d')
+        self.clusters = array('q')
+        for listing in listings:
+            self.append(listing)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Собирает пакет из строк (id, категория, сделка, комнаты, район,
+        заголовок, цена числом, цена текстом, ссылка, местоположение, первое появление,
+        широта, долгота)."""
+        batch = cls()
+        for row in rows:
+            batch._append_values(*row)
+        return batch
+
+    def _append_values(self, listing_id, category, transaction, rooms, district,
+                       title, price_value, price, link, location, first_seen, lat=None, lon=None):
+        self.ids.append(listing_id)
+        self.categories.append(_intern(category))
+        self.transactions.append(_intern(transaction))
+        self.rooms.append(_intern(rooms))
+        self.districts.append(_intern(district))
+        self.titles.append(title)
+        self.price_values.append(MISSING_PRICE if price_value is None else price_value)
+        self.prices.append(price)
+        self.links.append(link)
+        self.locations.append(location)
+        self.first_seen.append(_float_or_nan(first_seen))
+        self.lats.append(_float_or_nan(lat))
+        self.lons.append(_float_or_nan(lon))
+        # Пока копии не найдены, каждое объявление — своя группа
+        self.clusters.append(len(self.clusters))
+
+    def append(self, listing):
+        self._append_values(
+            listing.id, listing.category, listing.transaction, listing.rooms, listing.district,
+            listing.title, listing.price_value, listing.price, listing.link, listing.location,
+            listing.first_seen, listing.lat, listing.lon,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        price_value = self.price_values[index]
+        return Listing(
+            self.ids[index], self.titles[index], self.prices[index], self.links[index],
+            self.locations[index],
+            None if price_value == MISSING_PRICE else price_value,
+            self.categories[index], self.transactions[index], self.rooms[index], self.districts[index],
+            _nan_to_none(self.first_seen[index]), _nan_to_none(self.lats[index]), _nan_to_none(self.lons[index]),
+        )
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def take(self, indices):
+        """Возвращает объявления с указанными номерами строк."""
+        return [self[int(index)] for index in indices]
+
+    def reorder(self, order):
+        """Возвращает новый пакет со строками в порядке ``order``."""
+        order = [int(index) for index in order]
+        batch = ListingBatch()
+        for name in self.__slots__:
+            column = getattr(self, name)
+            if isinstance(column, StringColumn):
+                column = column.reorder(order)
+            elif isinstance(column, array):
+                column = array(column.typecode, [column[index] for index in order])
+            else:
+                column = [column[index] for index in order]
+            setattr(batch, name, column)
+        return batch
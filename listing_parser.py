@@ -0,0 +1,133 @@
+import json
+import logging
+import re
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from dedup import minhash_signature
+from listing import Listing
+
+logger = logging.getLogger(__name__)
+
+OLX_BASE_URL = 'https://www.olx.ua'
+
+# XPath-выражения компилируются один раз при импорте модуля
+_HTML_PARSER = etree.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+_CARDS = etree.XPath('//div[@data-cy="l-card"]')
+_LINK = etree.XPath('string((.//a[@href])[1]/@href)')
+_TITLE = etree.XPath('normalize-space((.//*[@data-cy="ad-card-title"]//h4 | .//h6)[1])')
+_PRICE = etree.XPath('normalize-space((.//*[@data-testid="ad-price"])[1])')
+_LOCATION = etree.XPath('normalize-space((.//*[@data-testid="location-date"])[1])')
+_STATE_SCRIPT = etree.XPath('string((//script[contains(., "__PRERENDERED_STATE__")])[1])')
+_STATE_LITERAL = re.compile(r'__PRERENDERED_STATE__\s*=\s*(".*")\s*;?\s*$', re.DOTALL)
+
+
+def parse_price(text):
+    """Возвращает цену из строки OLX как целое число или None."""
+    digits = re.sub(r'\D', '', text or '')
+    return int(digits) if digits else None
+
+
+def _make_listing(listing_id, title, price, href, location, base_url, details=(None, None, '')):
+    lat, lon, description = details
+    price_value = parse_price(price)
+    return Listing(
+        id=listing_id or href,
+        title=title,
+        price=price,
+        link=href if href.startswith('http') else base_url + href,
+        location=location,
+        price_value=price_value,
+        lat=lat,
+        lon=lon,
+        signature=minhash_signature(title, description, price_value),
+    )
+
+
+def _state_ads(root):
+    """Объявления из встроенного JSON состояния страницы (``window.__PRERENDERED_STATE__``).
+
+    В карточках нет координат и описания, а в состоянии у каждого объявления
+    они есть. Состояние — JSON, записанный строкой JSON, поэтому декодируется дважды.
+    """
+    match = _STATE_LITERAL.search(_STATE_SCRIPT(root))
+    if not match:
+        return []
+    try:
+        state = json.loads(json.loads(match.group(1)))
+        listing = state.get('listing') or {}
+        # На OLX объявления лежат в listing.listing.ads
+        return (listing.get('listing') or listing).get('ads') or []
+    except (ValueError, AttributeError):
+        logger.warning("Не удалось разобрать состояние страницы OLX")
+        return []
+
+
+def _ad_details(root):
+    """Возвращает координаты и описания объявлений страницы: ``{id: (широта, долгота, описание)}``."""
+    details = {}
+    for ad in _state_ads(root):
+        point = ad.get('map') or {}
+        lat, lon = point.get('lat'), point.get('lon')
+        if not (isinstance(lat, (int, float)) and isinstance(lon, (int, float))):
+            lat = lon = None
+        description = ad.get('description')
+        details[str(ad.get('id'))] = (
+            None if lat is None else float(lat),
+            None if lon is None else float(lon),
+            description if isinstance(description, str) else '',
+        )
+    return details
+
+
+def parse_listings(content, base_url=OLX_BASE_URL):
+    """Извлекает карточки объявлений из HTML страницы результатов OLX.
+
+    Страница разбирается lxml напрямую из байтов ответа, а из каждой карточки
+    заранее скомпилированными XPath забираются только заголовок, цена, ссылка,
+    местоположение и идентификатор. Координаты и описание (для подписи
+    поиска копий) берутся из состояния страницы.
+    """
+    if not content or not content.strip():
+        return []
+    root = etree.fromstring(content, _HTML_PARSER)
+    if root is None:
+        return []
+    cards = _CARDS(root)
+    if not cards:
+        return []
+    details = _ad_details(root)
+    listings = []
+    for card in cards:
+        href = _LINK(card)
+        title = _TITLE(card)
+        if not href or not title:
+            continue
+        listings.append(_make_listing(
+            card.get('id'), title, _PRICE(card), href, _LOCATION(card), base_url,
+            details.get(card.get('id'), (None, None, ''))
+        ))
+    return listings
+
+
+def parse_listings_soup(content, base_url=OLX_BASE_URL):
+    """Разбирает страницу через BeautifulSoup (эталон для сравнения в бенчмарке)."""
+    soup = BeautifulSoup(content, 'lxml')
+    listings = []
+    for card in soup.select('div[data-cy="l-card"]'):
+        link = card.find('a', href=True)
+        title = card.select_one('[data-cy="ad-card-title"] h4, h6')
+        if not link or not title:
+            continue
+        price = card.select_one('[data-testid="ad-price"]')
+        location = card.select_one('[data-testid="location-date"]')
+        listings.append(_make_listing(
+            card.get('id'),
+            title.get_text(strip=True),
+            price.get_text(' ', strip=True) if price else '',
+            link['href'],
+            location.get_text(' ', strip=True) if location else '',
+            base_url,
+        ))
+    return listings
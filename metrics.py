@@ -0,0 +1,181 @@
+import bisect
+import functools
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from telegram.request import HTTPXRequest
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Монотонно растущий счётчик с метками."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами корзин."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            # Счётчики по корзинам (последняя — +Inf), сумма и количество
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока ``with``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', bound)])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Gauge:
+    """Текущее значение, которое вычисляется в момент чтения метрик.
+
+    ``callback`` возвращает число или словарь {значение метки: число}.
+    """
+
+    def __init__(self, name, documentation, callback, labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelname = labelname
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} gauge'
+        value = self.callback()
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                yield f'{self.name}{{{self.labelname}="{label}"}} {item}'
+        else:
+            yield f'{self.name} {value}'
+
+
+class Registry:
+    """Набор метрик, отдаваемый в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'bot_handler_seconds', 'Время выполнения обработчиков шагов мастера', ['handler']
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ['handler']
+))
+CONVERSATION_STEPS = REGISTRY.register(Counter(
+    'bot_conversation_steps_total', 'Сколько раз пользователи проходили шаг мастера', ['step']
+))
+TELEGRAM_API_LATENCY = REGISTRY.register(Histogram(
+    'bot_telegram_api_seconds', 'Время вызовов Telegram Bot API', ['method']
+))
+SCRAPE_LATENCY = REGISTRY.register(Histogram(
+    'bot_scrape_seconds', 'Время обхода одной комбинации поиска на OLX', ['source']
+))
+LOOKUP_LATENCY = REGISTRY.register(Histogram(
+    'bot_listing_lookup_seconds', 'Время подбора объявлений для ответа', ['source'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+))
+
+
+def instrument_handler(step):
+    """Декоратор обработчика: замеряет время, считает шаги мастера и ошибки."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            CONVERSATION_STEPS.inc(step=step)
+            started = time.perf_counter()
+            try:
+                return await handler(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=step)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - started, handler=step)
+        return wrapper
+    return decorator
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTP-клиент бота, замеряющий время каждого метода Bot API."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        with TELEGRAM_API_LATENCY.time(method=url.rsplit('/', 1)[-1]):
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+
+async def start_metrics_server(host='127.0.0.1', port=9100, registry=REGISTRY):
+    """Запускает HTTP-сервер с метриками на /metrics и возвращает его runner."""
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
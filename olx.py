@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+import aiohttp
+
+from listing_parser import OLX_BASE_URL, parse_listings
+
+logger = logging.getLogger(__name__)
+
+# Разделы OLX для каждой пары (категория, тип сделки) по городу Днепр
+CATEGORY_PATHS = {
+    ('apartment', 'rent'): '/d/uk/nedvizhimost/kvartiry/dolgosrochnaya-arenda-kvartir/dnepr/',
+    ('apartment', 'buy'): '/d/uk/nedvizhimost/kvartiry/prodazha-kvartir/dnepr/',
+    ('house', 'rent'): '/d/uk/nedvizhimost/doma/arenda-domov/dnepr/',
+    ('house', 'buy'): '/d/uk/nedvizhimost/doma/prodazha-domov/dnepr/',
+}
+
+# Значения фильтра OLX по количеству комнат
+ROOMS_FILTER = {
+    '1_room': 'odnokomnatnye',
+    '2_rooms': 'dvuhkomnatnye',
+    '3_rooms': 'trehkomnatnye',
+    '4_plus_rooms': 'chetyrehkomnatnye',
+}
+
+DEFAULT_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+    ),
+    'Accept-Language': 'uk-UA,uk;q=0.9,ru;q=0.8',
+}
+
+
+class OlxClient:
+    """Асинхронный клиент OLX с общим пулом соединений.
+
+    Одна сессия aiohttp переиспользуется всеми обработчиками: соединения
+    держатся открытыми (keep-alive), а число одновременных запросов к одному
+    хосту ограничено, чтобы параллельные пользователи не упирались друг в друга
+    и не перегружали OLX.
+    """
+
+    def __init__(self, base_url=OLX_BASE_URL, max_connections=100, max_per_host=8,
+                 timeout=15, keepalive_timeout=30, parser_pool=None):
+        self.base_url = base_url.rstrip('/')
+        self.parser_pool = parser_pool
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=5)
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._session_lock = asyncio.Lock()
+
+    async def _get_session(self):
+        """Лениво создаёт сессию внутри работающего цикла событий."""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.max_connections,
+                        limit_per_host=self.max_per_host,
+                        keepalive_timeout=self.keepalive_timeout,
+                        ttl_dns_cache=300,
+                    )
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=self.timeout,
+                        headers=DEFAULT_HEADERS,
+                    )
+        return self._session
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def build_params(self, rooms, budget_min, budget_max, page=1):
+        """Формирует параметры запроса к странице результатов."""
+        params = {
+            'currency': 'USD',
+            'search[order]': 'created_at:desc',
+            'search[filter_float_price:from]': budget_min,
+            'search[filter_float_price:to]': budget_max,
+        }
+        if rooms in ROOMS_FILTER:
+            params['search[filter_enum_number_of_rooms_string][0]'] = ROOMS_FILTER[rooms]
+        if page > 1:
+            params['page'] = page
+        return params
+
+    async def fetch_page_if_modified(self, path, params, etag=None, last_modified=None):
+        """Условно загружает страницу по ETag/Last-Modified.
+
+        Возвращает ``(содержимое, etag, last_modified)``; содержимое равно None,
+        если сервер ответил 304 и страница не изменилась.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        session = await self._get_session()
+        async with session.get(self.base_url + path, params=params, headers=headers) as response:
+            if response.status == 304:
+                return None, etag, last_modified
+            response.raise_for_status()
+            return (
+                await response.read(),
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+            )
+
+    async def parse(self, content):
+        """Разбирает страницу результатов, по возможности в пуле процессов."""
+        if self.parser_pool is not None:
+            return await self.parser_pool.parse(content, self.base_url)
+        return parse_listings(content, self.base_url)
@@ -0,0 +1,118 @@
+from types import MappingProxyType
+from typing import NamedTuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+class Option(NamedTuple):
+    """Вариант ответа мастера: callback_data кнопки, подпись для пользователя
+    и необязательное значение варианта (например, границы бюджета)."""
+    key: str
+    label: str
+    value: object = None
+
+
+class BudgetRange(NamedTuple):
+    """Границы бюджета в долларах, включительно."""
+    min: int
+    max: int
+
+    def __contains__(self, price):
+        return self.min <= price <= self.max
+
+
+class OptionGroup:
+    """Набор вариантов одного шага мастера.
+
+    Из одного списка вариантов строятся клавиатура, разметка и словари
+    callback_data → подпись и callback_data → значение, поэтому подписи и
+    значения не дублируются в коде.
+    """
+
+    def __init__(self, options, columns=2):
+        self.options = tuple(Option(*option) for option in options)
+        self.keys = tuple(option.key for option in self.options)
+        self.labels = MappingProxyType({option.key: option.label for option in self.options})
+        self.values = MappingProxyType({option.key: option.value for option in self.options})
+        self.keyboard = [
+            [InlineKeyboardButton(option.label, callback_data=option.key) for option in self.options[i:i + columns]]
+            for i in range(0, len(self.options), columns)
+        ]
+        self.markup = InlineKeyboardMarkup(self.keyboard)
+
+    def __iter__(self):
+        return iter(self.options)
+
+    def __contains__(self, key):
+        return key in self.labels
+
+    def label(self, key, default=None):
+        """Возвращает подпись варианта или ``default``, если такого варианта нет."""
+        return self.labels.get(key, default)
+
+    def value(self, key, default=None):
+        """Возвращает значение варианта или ``default``, если такого варианта нет."""
+        return self.values.get(key, default)
+
+
+# Категории
+CATEGORIES = OptionGroup([
+    ('rent_apartment', "Аренда квартиры"),
+    ('buy_apartment', "Покупка квартиры"),
+    ('rent_house', "Аренда дома"),
+    ('buy_house', "Покупка дома"),
+])
+
+# Количество комнат
+ROOMS = OptionGroup([
+    ('1_room', "1 комната"),
+    ('2_rooms', "2 комнаты"),
+    ('3_rooms', "3 комнаты"),
+    ('4_plus_rooms', "4 и более комнат"),
+])
+
+# Районы города Днепр
+DISTRICTS = OptionGroup([
+    ('central_district', "Центральный"),
+    ('dnepropetrovsk_district', "Днепропетровский"),
+    ('zhovtnevyi_district', "Жовтневый"),
+    ('sobornyi_district', "Соборный"),
+    ('lomonosovskyi_district', "Ломоносовский"),
+    ('partyzanskyi_district', "Партизанский"),
+])
+
+# Типы ремонта
+RENOVATIONS = OptionGroup([
+    ('cosmetic_renovation', "Косметический"),
+    ('capital_renovation', "Капитальный"),
+    ('designer_renovation', "Дизайнерский"),
+    ('no_renovation', "Не требуется"),
+])
+
+# Бюджеты и их границы в долларах
+BUDGETS = OptionGroup([
+    ('budget_under_10k', "До 10 000$", BudgetRange(0, 10000)),
+    ('budget_10k_20k', "10 000$ - 20 000$", BudgetRange(10000, 20000)),
+    ('budget_20k_30k', "20 000$ - 30 000$", BudgetRange(20000, 30000)),
+    ('budget_over_30k', "Более 30 000$", BudgetRange(30000, 1000000)),  # Большое число для верхней границы
+])
+DEFAULT_BUDGET_RANGE = BudgetRange(0, 1000000)
+
+
+def budget_range(budget_key):
+    """Возвращает границы выбранного бюджета (или весь диапазон цен)."""
+    return BUDGETS.value(budget_key, DEFAULT_BUDGET_RANGE)
+
+
+def budget_keys_for_price(price):
+    """Возвращает ключи всех бюджетов, в границы которых попадает цена."""
+    return [option.key for option in BUDGETS if price in option.value]
+
+
+# Способы оплаты
+PAYMENTS = OptionGroup([
+    ('payment_cash', "Наличные"),
+    ('payment_installment', "Рассрочка"),
+    ('payment_mortgage', "Ипотека"),
+    ('payment_unsure', "Не определился"),
+])
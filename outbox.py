@@ -0,0 +1,241 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: ответы пользователю всегда уходят раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class TokenBucket:
+    """Ведро токенов: не более ``rate`` событий в секунду с запасом ``capacity``."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', '_timer')
+
+    def __init__(self, rate, capacity=1, timer=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._timer = timer
+        self.updated = timer()
+
+    def _refill(self):
+        now = self._timer()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Сколько секунд ждать до появления токена (0 — токен есть)."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class _OutgoingMessage:
+    __slots__ = ('chat_id', 'priority', 'kwargs', 'future', 'attempts')
+
+    def __init__(self, chat_id, priority, kwargs, future):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class MessageOutbox:
+    """Единая очередь исходящих сообщений с учётом лимитов Telegram.
+
+    Сообщения ограничиваются общим ведром токенов (``global_rate`` в секунду)
+    и ведром на каждый чат (``chat_rate`` для личных чатов, ``group_rate`` для
+    групп). Внутри чата порядок сообщений сохраняется, а чаты, исчерпавшие
+    лимит, не задерживают остальных. Полоса INTERACTIVE всегда обслуживается
+    раньше BULK. При ответе 429 отправка приостанавливается на указанное
+    Telegram время, и сообщение отправляется повторно.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, group_rate=20 / 60,
+                 max_in_flight=10, max_retries=3):
+        self.bot = None
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chat_buckets = {}
+        self._pending = {priority: OrderedDict() for priority in PRIORITIES}
+        self._busy_chats = set()
+        self._paused_until = 0
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._deliveries = set()
+        self._draining = False
+
+    def start(self, bot):
+        """Запускает фоновую отправку через ``bot``."""
+        self.bot = bot
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=5):
+        """Останавливает отправку.
+
+        Ответы пользователям (полоса INTERACTIVE) досылаются не дольше
+        ``timeout`` секунд; новые массовые рассылки за это время не
+        начинаются. Оставшиеся сообщения отменяются.
+        """
+        if self._worker is not None:
+            if timeout:
+                await self._drain(timeout)
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            self._draining = False
+        for lanes in self._pending.values():
+            for queue in lanes.values():
+                for message in queue:
+                    message.future.cancel()
+            lanes.clear()
+
+    async def _drain(self, timeout):
+        self._draining = True
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while self._pending[INTERACTIVE] or self._deliveries:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(
+                    "Не дождались отправки %d ответов пользователям при остановке",
+                    self.pending()[INTERACTIVE]
+                )
+                return
+            await asyncio.sleep(min(0.05, remaining))
+
+    def pending(self):
+        """Число сообщений в очереди по полосам приоритета."""
+        return {
+            priority: sum(len(queue) for queue in lanes.values())
+            for priority, lanes in self._pending.items()
+        }
+
+    def send_message(self, chat_id, text, priority=BULK, **kwargs):
+        """Ставит сообщение в очередь и возвращает future с отправленным Message."""
+        future = asyncio.get_running_loop().create_future()
+        message = _OutgoingMessage(chat_id, priority, dict(text=text, **kwargs), future)
+        self._pending[priority].setdefault(chat_id, deque()).append(message)
+        self._wakeup.set()
+        return future
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.group_rate if chat_id < 0 else self.chat_rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_message(self):
+        """Выбирает следующее сообщение; иначе возвращает время до готовности чата."""
+        wait = None
+        for priority in (INTERACTIVE,) if self._draining else PRIORITIES:
+            lanes = self._pending[priority]
+            for chat_id, queue in lanes.items():
+                if chat_id in self._busy_chats:
+                    continue
+                delay = self._chat_bucket(chat_id).delay()
+                if delay == 0:
+                    message = queue.popleft()
+                    if not queue:
+                        del lanes[chat_id]
+                    return message, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            message, wait = self._next_message()
+            if message is None:
+                self._prune_buckets()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._global.delay()
+            if delay:
+                await asyncio.sleep(delay)
+            self._global.consume()
+            self._chat_bucket(message.chat_id).consume()
+
+            await self._in_flight.acquire()
+            self._busy_chats.add(message.chat_id)
+            task = asyncio.create_task(self._deliver(message))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    def _prune_buckets(self):
+        # Полное ведро без ожидающих сообщений ничем не отличается от нового
+        waiting = set(itertools.chain.from_iterable(self._pending.values())) | self._busy_chats
+        for chat_id in [
+            chat_id for chat_id, bucket in self._chat_buckets.items()
+            if chat_id not in waiting and bucket.delay() == 0 and bucket.tokens >= bucket.capacity
+        ]:
+            del self._chat_buckets[chat_id]
+
+    async def _deliver(self, message):
+        try:
+            message.attempts += 1
+            result = await self.bot.send_message(chat_id=message.chat_id, **message.kwargs)
+        except RetryAfter as exc:
+            logger.warning("Telegram просит подождать %s с перед отправкой", exc.retry_after)
+            self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+            self._requeue(message)
+        except BadRequest as exc:
+            self._fail(message, exc)
+        except NetworkError as exc:
+            # Сетевые сбои и таймауты повторяем ограниченное число раз
+            if message.attempts < self.max_retries:
+                self._requeue(message)
+            else:
+                self._fail(message, exc)
+        except Exception as exc:
+            self._fail(message, exc)
+        else:
+            if not message.future.done():
+                message.future.set_result(result)
+        finally:
+            self._busy_chats.discard(message.chat_id)
+            self._in_flight.release()
+            self._wakeup.set()
+
+    def _fail(self, message, exc):
+        logger.warning("Не удалось отправить сообщение в чат %s: %s", message.chat_id, exc)
+        if not message.future.done():
+            message.future.set_exception(exc)
+            # Ошибка уже записана в лог, а результат многих сообщений никто не ждёт
+            message.future.exception()
+
+    def _requeue(self, message):
+        # Повтор встаёт в начало очереди своего чата, чтобы не нарушать порядок
+        if message.future.cancelled():
+            return
+        lanes = self._pending[message.priority]
+        lanes.setdefault(message.chat_id, deque()).appendleft(message)
+        lanes.move_to_end(message.chat_id, last=False)
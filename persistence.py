@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+
+import aiosqlite
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+# Таблица с данными и имя ключевого столбца для каждого вида данных
+_DATA_TABLES = {
+    'user_data': 'user_id',
+    'chat_data': 'chat_id',
+}
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранит состояние разговоров и ``user_data`` в SQLite.
+
+    Application передаёт сюда только изменившиеся записи; они накапливаются в
+    памяти и записываются одной транзакцией по каждому циклу обновления
+    (раз в ``update_interval`` секунд), поэтому нажатия кнопок не ждут диска.
+    """
+
+    def __init__(self, path, update_interval=10, store_data=None):
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self._db = None
+        self._dirty = {'user_data': {}, 'chat_data': {}}
+        self._dirty_bot_data = None
+        self._dirty_conversations = {}
+        self._write_task = None
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+
+    async def _connect(self):
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.path)
+            await self._db.execute('PRAGMA journal_mode=WAL')
+            await self._db.executescript(SCHEMA)
+            await self._db.commit()
+        return self._db
+
+    async def _load_data(self, table):
+        db = await self._connect()
+        async with db.execute(f'SELECT {_DATA_TABLES[table]}, data FROM {table}') as cursor:
+            return {row[0]: json.loads(row[1]) for row in await cursor.fetchall()}
+
+    async def get_user_data(self):
+        return await self._load_data('user_data')
+
+    async def get_chat_data(self):
+        return await self._load_data('chat_data')
+
+    async def get_bot_data(self):
+        db = await self._connect()
+        async with db.execute('SELECT data FROM bot_data WHERE id = 0') as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        db = await self._connect()
+        async with db.execute('SELECT key, state FROM conversations WHERE name = ?', (name,)) as cursor:
+            return {
+                tuple(json.loads(key)): json.loads(state)
+                for key, state in await cursor.fetchall()
+            }
+
+    def _schedule_write(self):
+        # Все update_* одного цикла вызываются вместе, поэтому запись
+        # откладывается до конца текущей итерации цикла событий
+        if self._closed:
+            return
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    async def update_conversation(self, name, key, new_state):
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id, data):
+        self._dirty['user_data'][user_id] = data
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id, data):
+        self._dirty['chat_data'][chat_id] = data
+        self._schedule_write()
+
+    async def update_bot_data(self, data):
+        self._dirty_bot_data = data
+        self._schedule_write()
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._dirty['user_data'][user_id] = None
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id):
+        self._dirty['chat_data'][chat_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def _write_pending(self):
+        """Записывает все накопленные изменения одной транзакцией.
+
+        Если запись не удалась, изменения возвращаются в очередь (более
+        свежие правки тех же записей важнее) и запись повторяется через
+        ``update_interval`` секунд.
+        """
+        await asyncio.sleep(0)
+        async with self._write_lock:
+            dirty, self._dirty = self._dirty, {'user_data': {}, 'chat_data': {}}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            bot_data, self._dirty_bot_data = self._dirty_bot_data, None
+            if not (any(dirty.values()) or conversations or bot_data is not None):
+                return True
+
+            try:
+                await self._write(dirty, conversations, bot_data)
+            except Exception:
+                logger.exception("Не удалось сохранить состояние разговоров, повтор через %s с", self.update_interval)
+                if self._db is not None:
+                    try:
+                        await self._db.rollback()
+                    except Exception:
+                        logger.exception("Не удалось откатить транзакцию сохранения")
+                for table in _DATA_TABLES:
+                    self._dirty[table] = {**dirty[table], **self._dirty[table]}
+                self._dirty_conversations = {**conversations, **self._dirty_conversations}
+                if self._dirty_bot_data is None:
+                    self._dirty_bot_data = bot_data
+                asyncio.get_running_loop().call_later(self.update_interval, self._schedule_write)
+                return False
+            logger.debug(
+                "Сохранено: пользователей %d, разговоров %d",
+                len(dirty['user_data']), len(conversations)
+            )
+            return True
+
+    async def _write(self, dirty, conversations, bot_data):
+        db = await self._connect()
+        for table, column in _DATA_TABLES.items():
+            upserts = [(k, json.dumps(v, ensure_ascii=False)) for k, v in dirty[table].items() if v is not None]
+            deletes = [(k,) for k, v in dirty[table].items() if v is None]
+            if upserts:
+                await db.executemany(f'INSERT OR REPLACE INTO {table} ({column}, data) VALUES (?, ?)', upserts)
+            if deletes:
+                await db.executemany(f'DELETE FROM {table} WHERE {column} = ?', deletes)
+        if bot_data is not None:
+            await db.execute(
+                'INSERT OR REPLACE INTO bot_data (id, data) VALUES (0, ?)',
+                (json.dumps(bot_data, ensure_ascii=False),)
+            )
+        ended = [(name, key) for (name, key), state in conversations.items() if state is None]
+        active = [
+            (name, key, json.dumps(state))
+            for (name, key), state in conversations.items() if state is not None
+        ]
+        if ended:
+            await db.executemany('DELETE FROM conversations WHERE name = ? AND key = ?', ended)
+        if active:
+            await db.executemany(
+                'INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)', active
+            )
+        await db.commit()
+
+    async def flush(self):
+        """Дописывает изменения и закрывает базу при остановке бота."""
+        if self._write_task is not None:
+            await self._write_task
+        self._closed = True
+        if not await self._write_pending():
+            logger.error("Несохранённое состояние разговоров потеряно при остановке")
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
@@ -0,0 +1,69 @@
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def iter_search_space(*groups):
+    """Перебирает все комбинации ключей из групп вариантов мастера.
+
+    Прогрев перебирает (категория, комнаты, бюджет): район в запрос к OLX не
+    входит, и объявления по районам раскладывает сам обход.
+    """
+    return itertools.product(*(group.keys for group in groups))
+
+
+class ListingPrewarmer:
+    """Периодически обновляет результаты поиска для всех комбинаций параметров.
+
+    ``refresh`` — корутина, которая получает объявления для одной комбинации
+    и кладёт их в кэш. Одновременно выполняется не более ``concurrency``
+    обновлений, чтобы не перегружать OLX. Необязательная корутина
+    ``after_run`` вызывается после каждого полного прохода.
+    """
+
+    def __init__(self, refresh, combinations, concurrency=8, after_run=None):
+        self.refresh = refresh
+        self.combinations = list(combinations)
+        self.concurrency = concurrency
+        self.after_run = after_run
+
+    async def run(self):
+        """Обновляет все комбинации и возвращает число неудачных обновлений."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def refresh_one(combination):
+            async with semaphore:
+                try:
+                    await self.refresh(*combination)
+                    return True
+                except Exception:
+                    logger.exception("Не удалось обновить объявления для %s", combination)
+                    return False
+
+        results = await asyncio.gather(*(refresh_one(c) for c in self.combinations))
+        failed = results.count(False)
+        logger.info(
+            "Прогрев кэша завершён: %d комбинаций, ошибок %d, %.1f с",
+            len(results), failed, time.monotonic() - started
+        )
+        if self.after_run is not None:
+            await self.after_run()
+        return failed
+
+    def schedule(self, scheduler, interval):
+        """Регистрирует задачу прогрева с немедленным первым запуском."""
+        return scheduler.add_job(
+            self.run,
+            'interval',
+            seconds=interval,
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            id='listings_prewarm',
+            replace_existing=True,
+        )
@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+
+from listing import ListingBatch
+from options import DISTRICTS, RENOVATIONS, ROOMS
+
+UNKNOWN = -1
+
+CATEGORY_CODES = {'apartment': 0, 'house': 1}
+TRANSACTION_CODES = {'rent': 0, 'buy': 1}
+ROOM_CODES = {key: code for code, key in enumerate(ROOMS.keys)}
+DISTRICT_CODES = {key: code for code, key in enumerate(DISTRICTS.keys)}
+RENOVATION_CODES = {key: code for code, key in enumerate(RENOVATIONS.keys)}
+
+# В карточках OLX нет отдельного поля ремонта, поэтому он угадывается по заголовку
+RENOVATION_KEYWORDS = (
+    ('designer_renovation', ('дизайн',)),
+    ('capital_renovation', ('капремонт', 'капітальн', 'капитальн', 'євроремонт', 'евроремонт')),
+    ('no_renovation', ('без ремонт', 'після будівельників', 'после строителей')),
+    ('cosmetic_renovation', ('косметичн', 'косметическ', 'житловий стан', 'жилое состояние')),
+)
+
+# Веса составляющих релевантности
+FRESHNESS_WEIGHT = 1.0
+RENOVATION_WEIGHT = 0.7
+PRICE_FIT_WEIGHT = 0.5
+FRESHNESS_HALF_LIFE = 72 * 3600
+
+# Во сколько раз больше лучших кандидатов отбирается до удаления копий
+DEDUP_OVERSAMPLE = 4
+
+
+def renovation_key(title):
+    """Угадывает тип ремонта по заголовку объявления."""
+    title = title.lower()
+    for key, keywords in RENOVATION_KEYWORDS:
+        if any(keyword in title for keyword in keywords):
+            return key
+    return None
+
+
+def _codes(values, mapping):
+    return np.fromiter((mapping.get(value, UNKNOWN) for value in values), dtype=np.int8, count=len(values))
+
+
+def _bucket(category, transaction, rooms, district):
+    """Сводит коды фильтров мастера в один целочисленный ключ."""
+    return (
+        ((category + 1) * 4 + (transaction + 1)) * 16 + (rooms + 1)
+    ) * 16 + (district + 1)
+
+
+class ListingIndex:
+    """Колоночный индекс объявлений для фильтрации и ранжирования.
+
+    Признаки объявлений хранятся в массивах NumPy (цена, комнаты, район,
+    ремонт, время первого появления). Фильтры мастера выбирают непрерывный
+    отрезок массивов бинарным поиском, релевантность считается векторно,
+    а лучшие ``k`` объявлений выбираются через ``argpartition`` без полной
+    сортировки. Из каждой группы копий (колонка ``clusters`` пакета) в ответ
+    попадает только самое релевантное объявление.
+    """
+
+    def __init__(self, batch):
+        if not isinstance(batch, ListingBatch):
+            batch = ListingBatch(batch)
+        category = _codes(batch.categories, CATEGORY_CODES)
+        transaction = _codes(batch.transactions, TRANSACTION_CODES)
+        rooms = _codes(batch.rooms, ROOM_CODES)
+        district = _codes(batch.districts, DISTRICT_CODES)
+        renovation = _codes([renovation_key(title) for title in batch.titles], RENOVATION_CODES)
+        # Числовые колонки пакета читаются без копирования; отсутствующая цена
+        # в пакете уже записана как UNKNOWN
+        price = np.frombuffer(batch.price_values, dtype=np.int64)
+        first_seen = np.frombuffer(batch.first_seen, dtype=np.float64)
+        cluster = np.frombuffer(batch.clusters, dtype=np.int64)
+
+        # Упорядочиваем по (комбинация фильтров, цена): все объявления одной
+        # комбинации лежат подряд и отсортированы по цене, поэтому фильтр
+        # сводится к двум бинарным поискам. Ключи хранятся в int64, чтобы
+        # searchsorted не копировал массив при сравнении с int из Python
+        bucket = _bucket(category.astype(np.int64), transaction, rooms, district)
+        order = np.lexsort((price, bucket))
+        self.records = batch.reorder(order)
+        self.bucket = bucket[order]
+        self.price = price[order]
+        self.renovation = renovation[order]
+        self.first_seen = first_seen[order]
+        self.cluster = cluster[order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def top(self, category, transaction, rooms, district, renovation, budget_min, budget_max, k=5, now=None):
+        """Возвращает до ``k`` самых релевантных объявлений, подходящих под фильтры мастера."""
+        bucket = _bucket(
+            CATEGORY_CODES.get(category, UNKNOWN),
+            TRANSACTION_CODES.get(transaction, UNKNOWN),
+            ROOM_CODES.get(rooms, UNKNOWN),
+            DISTRICT_CODES.get(district, UNKNOWN),
+        )
+        start = np.searchsorted(self.bucket, bucket, 'left')
+        end = np.searchsorted(self.bucket, bucket, 'right')
+        prices = self.price[start:end]
+        low = start + np.searchsorted(prices, budget_min, 'left')
+        high = start + np.searchsorted(prices, budget_max, 'right')
+        if low >= high:
+            return []
+        candidates = np.arange(low, high)
+
+        age = (now or time.time()) - self.first_seen[candidates]
+        freshness = np.exp2(-np.maximum(age, 0) / FRESHNESS_HALF_LIFE)
+
+        wanted = RENOVATION_CODES.get(renovation, UNKNOWN)
+        listing_renovation = self.renovation[candidates]
+        renovation_match = np.where(
+            listing_renovation == wanted, 1.0, np.where(listing_renovation == UNKNOWN, 0.5, 0.0)
+        )
+
+        # Ближе к середине бюджета — лучше
+        middle = (budget_min + budget_max) / 2
+        half_width = max((budget_max - budget_min) / 2, 1)
+        price_fit = 1.0 - np.minimum(np.abs(self.price[candidates] - middle) / half_width, 1.0)
+
+        score = (
+            FRESHNESS_WEIGHT * freshness
+            + RENOVATION_WEIGHT * renovation_match
+            + PRICE_FIT_WEIGHT * price_fit
+        )
+        shortlist = k * DEDUP_OVERSAMPLE
+        if len(candidates) > shortlist:
+            best = np.argpartition(-score, shortlist)[:shortlist]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-score[best], kind='stable')]
+        picked = self._one_per_cluster(candidates[best], k)
+        if len(picked) < k and len(best) < len(candidates):
+            # Среди лучших слишком много копий — ранжируем всех кандидатов
+            picked = self._one_per_cluster(candidates[np.argsort(-score, kind='stable')], k)
+        return self.records.take(picked)
+
+    def _one_per_cluster(self, ranked, k):
+        """Первые ``k`` строк из ``ranked``, не больше одной из каждой группы копий."""
+        _, first = np.unique(self.cluster[ranked], return_index=True)
+        return ranked[np.sort(first)[:k]]
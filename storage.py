@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from array import array
+
+import aiosqlite
+
+from dedup import near_duplicate_clusters
+from listing import Listing, ListingBatch
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    rooms TEXT NOT NULL,
+    district TEXT NOT NULL,
+    title TEXT NOT NULL,
+    price INTEGER,
+    price_text TEXT NOT NULL,
+    link TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    lat REAL,
+    lon REAL,
+    signature BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_listings_search
+    ON listings (category, transaction_type, district, rooms, price);
+"""
+
+# Колонки, добавленные после первой версии схемы: (имя, тип)
+ADDED_COLUMNS = (('lat', 'REAL'), ('lon', 'REAL'), ('signature', 'BLOB'))
+
+UPSERT_LISTING = """
+INSERT INTO listings (
+    id, category, transaction_type, rooms, district,
+    title, price, price_text, link, location, first_seen, last_seen, lat, lon, signature
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    category = excluded.category,
+    transaction_type = excluded.transaction_type,
+    rooms = excluded.rooms,
+    district = excluded.district,
+    title = excluded.title,
+    price = excluded.price,
+    price_text = excluded.price_text,
+    link = excluded.link,
+    location = excluded.location,
+    last_seen = excluded.last_seen,
+    lat = excluded.lat,
+    lon = excluded.lon,
+    -- Повторно записанные объявления приходят без подписи (см. release_signatures)
+    signature = COALESCE(excluded.signature, listings.signature)
+"""
+
+SEARCH_LISTINGS = """
+SELECT id, title, price_text, link, location, price, first_seen, lat, lon
+FROM listings
+WHERE category = ? AND transaction_type = ? AND district = ? AND rooms = ?
+    AND price BETWEEN ? AND ? AND last_seen >= ?
+ORDER BY last_seen DESC
+LIMIT ?
+"""
+
+LOAD_CORPUS = """
+SELECT id, category, transaction_type, rooms, district, title, price, price_text,
+    link, location, first_seen, lat, lon, signature
+FROM listings
+WHERE last_seen >= ?
+"""
+
+
+def build_corpus(rows):
+    """Собирает пакет из строк LOAD_CORPUS и группирует копии объявлений.
+
+    Копии одного объявления (перепосты, разные агентства) объединяются в
+    группы по подписям MinHash; номер группы записывается в ``clusters``.
+    """
+    batch = ListingBatch.from_rows(row[:-1] for row in rows)
+    clusters = near_duplicate_clusters([row[-1] for row in rows], [row[6] for row in rows])
+    batch.clusters = array('q', clusters.tolist())
+    return batch
+
+
+class ListingStore:
+    """Хранилище объявлений в SQLite.
+
+    Объявления сохраняются вместе с параметрами поиска, по которым они были
+    найдены, поэтому ответ пользователю строится одним запросом по индексу
+    (категория, сделка, район, комнаты, цена) без обращения к OLX.
+    """
+
+    def __init__(self, path, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._db = None
+
+    async def open(self):
+        """Открывает базу и создаёт таблицы при первом запуске."""
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute('PRAGMA journal_mode=WAL')
+        await self._db.execute('PRAGMA synchronous=NORMAL')
+        await self._db.executescript(SCHEMA)
+        await self._migrate()
+        await self._db.commit()
+
+    async def _migrate(self):
+        """Добавляет в таблицу из старой версии недостающие колонки."""
+        async with self._db.execute('PRAGMA table_info(listings)') as cursor:
+            existing = {row[1] for row in await cursor.fetchall()}
+        for name, kind in ADDED_COLUMNS:
+            if name not in existing:
+                await self._db.execute(f'ALTER TABLE listings ADD COLUMN {name} {kind}')
+
+    async def close(self):
+        """Закрывает соединение с базой."""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def upsert_many(self, category, transaction, rooms, district, listings, seen_at=None):
+        """Сохраняет объявления одной комбинации поиска, обновляя время последнего появления."""
+        seen_at = seen_at or time.time()
+        rows = [
+            (
+                listing.id, category, transaction, rooms, district,
+                listing.title, listing.price_value, listing.price,
+                listing.link, listing.location, seen_at, seen_at, listing.lat, listing.lon,
+                listing.signature,
+            )
+            for listing in listings
+        ]
+        if not rows:
+            return
+        await self._db.executemany(UPSERT_LISTING, rows)
+        await self._db.commit()
+
+    async def search(self, category, transaction, rooms, district, budget_min, budget_max, limit=50):
+        """Возвращает свежие объявления, подходящие под параметры поиска."""
+        cutoff = time.time() - self.max_age
+        # Чтение целиком за один шаг потока aiosqlite: незавершённый курсор
+        # держал бы старый снимок WAL, и запись другого обработчика в это же
+        # соединение сразу получала бы «database is locked»
+        rows = await self._db.execute_fetchall(
+            SEARCH_LISTINGS,
+            (category, transaction, district, rooms, int(budget_min), int(budget_max), cutoff, limit)
+        )
+        return [
+            Listing(*row[:6], category, transaction, rooms, district, *row[6:])
+            for row in rows
+        ]
+
+    async def load_corpus(self):
+        """Возвращает все свежие объявления с параметрами поиска пакетом ListingBatch.
+
+        Пакет и группы копий строятся в отдельном потоке (см. build_corpus),
+        чтобы не останавливать обработчики бота на время группировки.
+        """
+        cutoff = time.time() - self.max_age
+        rows = await self._db.execute_fetchall(LOAD_CORPUS, (cutoff,))
+        return await asyncio.to_thread(build_corpus, rows)
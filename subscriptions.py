@@ -0,0 +1,102 @@
+import logging
+from collections import defaultdict
+
+import aiosqlite
+
+from cache import TTLCache
+from options import budget_keys_for_price
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    district TEXT NOT NULL,
+    rooms TEXT NOT NULL,
+    budget TEXT NOT NULL,
+    PRIMARY KEY (user_id, category, transaction_type, district, rooms, budget)
+);
+"""
+
+
+class SubscriptionRegistry:
+    """Сохранённые поиски пользователей и сопоставление с ними новых объявлений.
+
+    Подписки хранятся в SQLite и держатся в памяти в виде инвертированного
+    индекса (категория, сделка, район, комнаты, бюджет) → id пользователей.
+    Сопоставление новых объявлений — это поиск по словарю для каждого
+    объявления, поэтому его стоимость зависит от числа совпадений, а не от
+    числа подписок.
+    """
+
+    def __init__(self, path, notified_ttl=24 * 3600):
+        self.path = path
+        self._db = None
+        self._index = defaultdict(set)
+        self._by_user = defaultdict(set)
+        # Объявление на границе бюджетов находится обходами двух комбинаций,
+        # поэтому запоминаем, о чём пользователь уже знает
+        self._notified = TTLCache(maxsize=100000, ttl=notified_ttl)
+
+    async def open(self):
+        """Открывает базу и загружает подписки в индекс."""
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute('PRAGMA journal_mode=WAL')
+        await self._db.executescript(SCHEMA)
+        await self._db.commit()
+        async with self._db.execute(
+            'SELECT user_id, category, transaction_type, district, rooms, budget FROM subscriptions'
+        ) as cursor:
+            for user_id, *key in await cursor.fetchall():
+                self._add(user_id, tuple(key))
+        logger.info("Загружено подписок: %d", sum(len(users) for users in self._index.values()))
+
+    async def close(self):
+        """Закрывает соединение с базой."""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def _add(self, user_id, key):
+        self._index[key].add(user_id)
+        self._by_user[user_id].add(key)
+
+    async def subscribe(self, user_id, category, transaction, district, rooms, budget):
+        """Подписывает пользователя на поиск; возвращает False, если подписка уже была."""
+        key = (category, transaction, district, rooms, budget)
+        if user_id in self._index.get(key, ()):
+            return False
+        await self._db.execute(
+            'INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?, ?, ?)', (user_id, *key)
+        )
+        await self._db.commit()
+        self._add(user_id, key)
+        return True
+
+    async def unsubscribe_all(self, user_id):
+        """Удаляет все подписки пользователя и возвращает их число."""
+        keys = self._by_user.pop(user_id, set())
+        for key in keys:
+            users = self._index[key]
+            users.discard(user_id)
+            if not users:
+                del self._index[key]
+        await self._db.execute('DELETE FROM subscriptions WHERE user_id = ?', (user_id,))
+        await self._db.commit()
+        return len(keys)
+
+    def match(self, category, transaction, district, rooms, listings):
+        """Раскладывает новые объявления по подписчикам: {user_id: [объявления]}."""
+        matches = defaultdict(list)
+        for listing in listings:
+            if listing.price_value is None:
+                continue
+            for budget in budget_keys_for_price(listing.price_value):
+                for user_id in self._index.get((category, transaction, district, rooms, budget), ()):
+                    if (user_id, listing.id) in self._notified:
+                        continue
+                    self._notified.set((user_id, listing.id), True)
+                    matches[user_id].append(listing)
+        return matches
@@ -0,0 +1,127 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий обновления Telegram по вебхуку.
+
+    Запросы без правильного секретного токена отклоняются. Принятые обновления
+    складываются в ограниченную очередь; если она переполнена, сервер отвечает
+    503, и Telegram повторит доставку позже. Обработчик очереди передаёт
+    обновления в ``application.process_update``.
+
+    Сервер рассчитан на один процесс бота: состояние разговоров и фоновые
+    задачи не разделяются между экземплярами, поэтому масштабировать его
+    горизонтально за балансировщиком нельзя.
+    """
+
+    def __init__(self, application, url, secret_token, path='/telegram',
+                 host='0.0.0.0', port=8080, queue_size=1000):
+        self.application = application
+        self.url = url.rstrip('/') + path
+        self.secret_token = secret_token
+        self.path = path
+        self.host = host
+        self.port = port
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._runner = None
+        self._consumer_task = None
+
+    def make_app(self):
+        """Создаёт aiohttp-приложение с маршрутами вебхука и проверки здоровья."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+    async def handle_update(self, request):
+        """Принимает обновление от Telegram и ставит его в очередь."""
+        token = request.headers.get(SECRET_HEADER, '')
+        # Сравниваются байты: compare_digest не принимает строки с не-ASCII символами
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            logger.warning("Отклонён запрос вебхука с неверным секретным токеном")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            logger.warning("Очередь вебхука переполнена, обновление отклонено")
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(self, request):
+        """Отвечает балансировщику нагрузки и сообщает длину очереди."""
+        return web.json_response({'queue': self.queue.qsize()})
+
+    async def _consume(self):
+        bot = self.application.bot
+        while True:
+            data = await self.queue.get()
+            try:
+                await self.application.process_update(Update.de_json(data, bot))
+            except Exception:
+                logger.exception("Не удалось обработать обновление из вебхука")
+            finally:
+                self.queue.task_done()
+
+    async def start(self):
+        """Запускает HTTP-сервер, обработчик очереди и регистрирует вебхук в Telegram."""
+        self._consumer_task = asyncio.create_task(self._consume())
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        await self.application.bot.set_webhook(
+            url=self.url,
+            secret_token=self.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info("Вебхук слушает %s:%s%s", self.host, self.port, self.path)
+
+    async def stop(self):
+        """Останавливает приём запросов и дообрабатывает очередь."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.queue.join()
+        if self._consumer_task is not None:
+            self._consumer_task.cancel()
+            self._consumer_task = None
+
+
+async def run_webhook(application, server):
+    """Запускает бота в режиме вебхука до получения SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,50 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from listing import Listing
+from listing_parser import parse_listings
+
+# Поля компактной записи, которую воркер возвращает в основной процесс
+RECORD_FIELDS = ('id', 'title', 'price', 'link', 'location', 'price_value', 'lat', 'lon', 'signature')
+
+
+def parse_page_records(content, base_url):
+    """Разбирает страницу в воркере и возвращает объявления кортежами."""
+    return [tuple(getattr(listing, field) for field in RECORD_FIELDS) for listing in parse_listings(content, base_url)]
+
+
+class ParserPool:
+    """Пул процессов для разбора страниц OLX вне цикла событий бота.
+
+    Разбор HTML нагружает процессор, поэтому выполняется в отдельных
+    процессах, а в основной процесс возвращаются компактные кортежи вместо
+    объектов. При ``max_workers=0`` страницы разбираются прямо в цикле событий.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    async def parse(self, content, base_url):
+        """Возвращает объявления со страницы."""
+        if self.max_workers:
+            loop = asyncio.get_running_loop()
+            records = await loop.run_in_executor(self._get_executor(), parse_page_records, content, base_url)
+        else:
+            records = parse_page_records(content, base_url)
+        return [Listing(**dict(zip(RECORD_FIELDS, record))) for record in records]
+
+    def close(self):
+        """Останавливает процессы пула."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None